@@ -4,19 +4,23 @@ Handles authentication related requests
 """
 
 import logging
+import os
 import uuid
 import json
 from datetime import datetime, timedelta
 import jwt
 from flask import Blueprint, request, jsonify, g, make_response
 
+from backend.utils.jwt_utils import JWTCodec
+
 logger = logging.getLogger(__name__)
 
 # Create a blueprint for auth routes
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
 # Secret key for JWT tokens
-JWT_SECRET = 'your-secret-key-here'  # In production, use env var
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-here')
+_jwt_codec = JWTCodec(JWT_SECRET)
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
@@ -47,7 +51,7 @@ def login():
         }
         
         # Generate JWT token
-        token = jwt.encode(token_data, JWT_SECRET, algorithm='HS256')
+        token = _jwt_codec.encode(token_data)
         
         # Create response
         response_data = {
@@ -113,7 +117,7 @@ def register():
     }
     
     # Generate JWT token
-    token = jwt.encode(token_data, JWT_SECRET, algorithm='HS256')
+    token = _jwt_codec.encode(token_data)
     
     # Create response
     response_data = {
@@ -174,7 +178,7 @@ def guest_login():
     }
     
     # Generate JWT token
-    token = jwt.encode(token_data, JWT_SECRET, algorithm='HS256')
+    token = _jwt_codec.encode(token_data)
     
     # Create response
     response_data = {
@@ -220,7 +224,7 @@ def refresh_token():
     
     try:
         # Decode token
-        payload = jwt.decode(auth_token, JWT_SECRET, algorithms=['HS256'])
+        payload = _jwt_codec.decode(auth_token)
         
         # Check if token is close to expiration
         exp = datetime.fromtimestamp(payload.get('exp', 0))
@@ -236,7 +240,7 @@ def refresh_token():
             payload['exp'] = exp_time
             
             # Generate new token
-            new_token = jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+            new_token = _jwt_codec.encode(payload)
             
             # Create response
             response_data = {
@@ -284,7 +288,7 @@ def check_session():
     
     try:
         # Decode token
-        payload = jwt.decode(auth_token, JWT_SECRET, algorithms=['HS256'])
+        payload = _jwt_codec.decode(auth_token)
         
         # Check if user or guest token
         is_guest = payload.get('is_guest', False)
@@ -11,6 +11,7 @@ from flask import request, jsonify, g, Response, abort, Blueprint
 
 from backend.services.chat_service import chat_service
 from backend.utils.message_formatter import MessageFormatter
+from backend.controllers.render_controller import invalidate_chat_list_cache
 
 logger = logging.getLogger(__name__)
 
@@ -108,7 +109,8 @@ class ChatController:
             formatted_messages = MessageFormatter.format_messages(messages, user_id)
             
             # Mark chat as read for this user
-            chat_service.mark_chat_read(chat_id, user_id)
+            if chat_service.mark_chat_read(chat_id, user_id):
+                invalidate_chat_list_cache(user_id)
             
             return jsonify({
                 'status': 'success',
@@ -145,6 +147,9 @@ class ChatController:
             if not message:
                 return jsonify({'error': 'Failed to create message'}), 500
             
+            # Last message preview changed for every participant
+            invalidate_chat_list_cache(*chat.get('participants', []))
+            
             # Return formatted message
             formatted_message = MessageFormatter.format_message(message, user_id)
             
@@ -185,6 +190,8 @@ class ChatController:
             if not chat:
                 return jsonify({'error': 'Failed to create chat'}), 500
             
+            invalidate_chat_list_cache(*participants)
+            
             return jsonify({
                 'status': 'success',
                 'chat': chat
@@ -212,6 +219,8 @@ class ChatController:
             if not success:
                 return jsonify({'error': 'Failed to mark chat as read'}), 500
             
+            invalidate_chat_list_cache(user_id)
+            
             return jsonify({
                 'status': 'success'
             })
@@ -3,13 +3,18 @@ Render Controller for ABDRE Chat Application
 Handles template rendering for server-side rendered pages
 """
 
-import json
+import hashlib
+import itertools
 import logging
 import os
 import re
-import requests
+import threading
+import cachetools
+import httpx
+import orjson
 from datetime import datetime
-from flask import g, request, redirect, url_for, jsonify, abort
+from functools import lru_cache
+from flask import g, request, redirect, url_for, jsonify, abort, Response
 
 from backend.services.template_service import template_service
 from backend.utils.message_formatter import MessageFormatter
@@ -18,6 +23,90 @@ from backend.utils.html_sanitizer import sanitize_html
 
 logger = logging.getLogger(__name__)
 
+# Chat IDs are lowercase UUIDs; compiled once at import
+_UUID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\Z')
+
+# Translation table for header name -> WSGI environ key conversion
+_DASH_TO_UNDERSCORE = str.maketrans('-', '_')
+
+# Internal API prefixes served by microservices:
+# (API prefix, base URL env var, default base URL, service path prefix)
+_SERVICE_ROUTES = (
+    ('/api/chats', 'CHAT_SERVICE_URL', 'http://localhost:5504', '/chats'),
+    ('/api/users', 'USER_SERVICE_URL', 'http://localhost:5502', '/users'),
+    ('/api/auth', 'AUTH_SERVICE_URL', 'http://localhost:5501', '/auth'),
+)
+
+# Templates compiled at startup: rendered pages plus their layouts and includes
+_PRECOMPILE_TEMPLATES = (
+    'index.html', 'login.html', 'my_chats.html', 'chat.html', 'create.html',
+    'settings.html', 'profile.html', 'invitation_accept.html', 'error.html',
+    'base.html', 'layouts/default.html', 'layouts/auth.html', 'layouts/app.html',
+    'components/header.html', 'components/footer.html', 'components/qr_invite.html',
+    'components/create_chat_popup.html', 'components/connection_status.html',
+)
+
+# Shared HTTP/2 client so microservice calls reuse pooled keep-alive connections
+_http_client = httpx.Client(
+    http2=True,
+    timeout=2.0,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+)
+
+# Error body returned when a microservice cannot be reached
+_SERVICE_UNAVAILABLE_BODY = orjson.dumps({"error": "Service unavailable"})
+
+# Serialized user JSON for the profile page, keyed by the user's claims
+_USER_JSON_CACHE = cachetools.TTLCache(maxsize=10000, ttl=60)
+
+# Parsed /api/chats bodies: user_id -> (auth token digest, chats data)
+_CHAT_LIST_CACHE = cachetools.TTLCache(maxsize=10000, ttl=5)
+
+# TTLCache is not thread-safe; guards both caches above
+_CACHE_LOCK = threading.Lock()
+
+
+def invalidate_chat_list_cache(*user_ids):
+    """
+    Drop cached chat lists after a chat write
+    
+    Args:
+        *user_ids: IDs of the users whose chat list changed
+    """
+    with _CACHE_LOCK:
+        for user_id in user_ids:
+            _CHAT_LIST_CACHE.pop(user_id, None)
+
+
+@lru_cache(maxsize=8)
+def _resolve_service_base(env_var, default):
+    """Resolve a service base URL from the environment once per process"""
+    return os.environ.get(env_var, default)
+
+
+@lru_cache(maxsize=16)
+def _render_anonymous_page(template_name, url, **context):
+    """
+    Render a page for anonymous visitors once and reuse the HTML
+    
+    The full request URL is part of the key because templates embed it
+    (og:url) and it carries any query parameters. Must be called inside
+    a request context. The cache lives until the process restarts.
+    
+    Args:
+        template_name: Template to render
+        url: Full request URL
+        **context: Additional template context (must be hashable)
+        
+    Returns:
+        bytes: Rendered HTML
+    """
+    return template_service.render(template_name,
+        user=None,
+        server_rendered=True,
+        **context
+    ).encode('utf-8')
+
 class RenderController:
     """Controller for server-side rendering"""
     
@@ -31,8 +120,19 @@ class RenderController:
         """Initialize with Flask app"""
         self.app = app
         
+        # Install per-request defaults: a guaranteed g.user (the auth
+        # middleware sets it first) and a timestamp shared by every render
+        @app.before_request
+        def set_request_defaults():
+            g.user = getattr(g, 'user', None)
+            g.request_time_iso = datetime.utcnow().isoformat()
+        
         # Register routes
         self._register_routes()
+        
+        # Move template parsing out of the first request for each page
+        compiled = template_service.precompile(_PRECOMPILE_TEMPLATES)
+        logger.info(f"Precompiled {compiled} templates")
     
     def _register_routes(self):
         """Register rendering routes with the app"""
@@ -46,15 +146,19 @@ class RenderController:
         
     def render_index(self):
         """Render the index page"""
+        # Anonymous landing page is identical for every visitor
+        if not g.user and not self.app.jinja_env.auto_reload:
+            return Response(_render_anonymous_page('index.html', request.url), mimetype='text/html')
+        
         return template_service.render('index.html', 
-            user=g.user if hasattr(g, 'user') else None,
+            user=g.user,
             server_rendered=True
         )
     
     def render_login(self):
         """Render the login page"""
         # If user is already authenticated, redirect to my-chats page
-        if hasattr(g, 'user') and g.user:
+        if g.user:
             return redirect('/my-chats')
             
         # Get optional redirect parameter
@@ -63,6 +167,13 @@ class RenderController:
         # Check if a specific error message needs to be displayed
         error = request.args.get('error')
         
+        # Without an error message the page only depends on the URL
+        if error is None and not self.app.jinja_env.auto_reload:
+            return Response(
+                _render_anonymous_page('login.html', request.url, redirect_to=redirect_to, error=None),
+                mimetype='text/html'
+            )
+        
         return template_service.render('login.html', 
             redirect_to=redirect_to,
             error=error,
@@ -72,7 +183,7 @@ class RenderController:
     def render_my_chats(self):
         """Render the my-chats page with server-side rendered chat list"""
         # Check if user is authenticated, redirect to login if not
-        if not hasattr(g, 'user') or not g.user:
+        if not g.user:
             return redirect('/login?redirect=/my-chats')
         
         # Get chat list for the user from API
@@ -80,39 +191,49 @@ class RenderController:
             user_id = g.user.get('user_id')
             token = request.cookies.get('auth_token')
             
-            response = self._make_api_request(
-                'GET',
-                '/api/chats',
-                headers={'Authorization': f'Bearer {token}'}
-            )
+            # Reuse a recent chat list fetched with the same token
+            token_digest = hashlib.blake2b((token or '').encode('utf-8'), digest_size=8).digest()
+            with _CACHE_LOCK:
+                cached = _CHAT_LIST_CACHE.get(user_id)
             
-            if response.status_code == 200:
-                chats_data = response.json()
-                
-                # Format chats for template
-                context = ChatListFormatter.prepare_chats_for_template(
-                    chats_data.get('chats', []),
-                    user_id
+            if cached is not None and cached[0] == token_digest:
+                chats_data = cached[1]
+            else:
+                response = self._make_api_request(
+                    'GET',
+                    '/api/chats',
+                    headers={'Authorization': f'Bearer {token}'}
                 )
                 
-                # Add additional context
-                context.update({
-                    'user': g.user,
-                    'server_rendered': True,
-                    'current_time': datetime.utcnow().isoformat()
-                })
+                if response.status_code != 200:
+                    logger.error(f"Error fetching chats: {response.status_code}")
+                    # Return empty chat list
+                    return template_service.render('my_chats.html', 
+                        chats=[],
+                        total_chats=0,
+                        unread_count=0,
+                        chats_json='[]',
+                        error=f"Could not load chats. Status: {response.status_code}"
+                    )
                 
-                return template_service.render('my_chats.html', **context)
-            else:
-                logger.error(f"Error fetching chats: {response.status_code}")
-                # Return empty chat list
-                return template_service.render('my_chats.html', 
-                    chats=[],
-                    total_chats=0,
-                    unread_count=0,
-                    chats_json=json.dumps([]),
-                    error=f"Could not load chats. Status: {response.status_code}"
-                )
+                chats_data = response.json()
+                with _CACHE_LOCK:
+                    _CHAT_LIST_CACHE[user_id] = (token_digest, chats_data)
+            
+            # Format chats for template
+            context = ChatListFormatter.prepare_chats_for_template(
+                chats_data.get('chats', []),
+                user_id
+            )
+            
+            # Add additional context
+            context.update({
+                'user': g.user,
+                'server_rendered': True,
+                'current_time': g.request_time_iso
+            })
+            
+            return template_service.render('my_chats.html', **context)
         
         except Exception as e:
             logger.exception(f"Error rendering my-chats page: {str(e)}")
@@ -120,18 +241,18 @@ class RenderController:
                 chats=[],
                 total_chats=0,
                 unread_count=0,
-                chats_json=json.dumps([]),
+                chats_json='[]',
                 error=f"An error occurred: {str(e)}"
             )
     
     def render_chat(self, chat_id):
         """Render the chat page with server-side rendered messages"""
         # Check if user is authenticated, redirect to login if not
-        if not hasattr(g, 'user') or not g.user:
+        if not g.user:
             return redirect(f'/login?redirect=/chat/{chat_id}')
         
         # Validate chat_id format
-        if not re.match(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', chat_id):
+        if not _UUID_RE.match(chat_id):
             return abort(404)
         
         try:
@@ -188,12 +309,16 @@ class RenderController:
                 'user': g.user,
                 'server_rendered': True,
                 'initial_connection_status': 'connecting',
-                'current_time': datetime.utcnow().isoformat(),
+                'current_time': g.request_time_iso,
                 'is_empty': len(messages) == 0
             }
             context.update(messages_context)
             
-            return template_service.render('chat.html', **context)
+            # Stream the page so long histories are flushed as they render; the
+            # first chunk is rendered here so template errors still reach the error page
+            chunks = template_service.stream('chat.html', **context)
+            first_chunk = next(chunks, '')
+            return Response(itertools.chain((first_chunk,), chunks), mimetype='text/html')
             
         except Exception as e:
             logger.exception(f"Error rendering chat page: {str(e)}")
@@ -205,7 +330,7 @@ class RenderController:
     def render_create_chat(self):
         """Render the create chat page"""
         # Check if user is authenticated, redirect to login if not
-        if not hasattr(g, 'user') or not g.user:
+        if not g.user:
             return redirect('/login?redirect=/create')
         
         return template_service.render('create.html',
@@ -247,7 +372,7 @@ class RenderController:
                 invitation_code=invitation_code,
                 is_qr_scan=is_qr_scan,
                 server_rendered=True,
-                user=g.user if hasattr(g, 'user') else None
+                user=g.user
             )
         except Exception as e:
             logger.exception(f"Error rendering invitation page: {str(e)}")
@@ -261,7 +386,7 @@ class RenderController:
     def render_settings(self):
         """Render the settings page"""
         # Check if user is authenticated, redirect to login if not
-        if not hasattr(g, 'user') or not g.user:
+        if not g.user:
             return redirect('/login?redirect=/settings')
         
         return template_service.render('settings.html',
@@ -272,12 +397,19 @@ class RenderController:
     def render_profile(self):
         """Render the user profile page"""
         # Check if user is authenticated, redirect to login if not
-        if not hasattr(g, 'user') or not g.user:
+        if not g.user:
             return redirect('/login?redirect=/profile')
         
         # Convert user object to JSON for client-side use
         try:
-            user_json = json.dumps(g.user) if g.user else '{}'
+            # Key on every claim so a changed username or role is never served stale
+            key = tuple(sorted(g.user.items()))
+            with _CACHE_LOCK:
+                user_json = _USER_JSON_CACHE.get(key)
+            if user_json is None:
+                user_json = orjson.dumps(g.user).decode('utf-8')
+                with _CACHE_LOCK:
+                    _USER_JSON_CACHE[key] = user_json
         except Exception as e:
             logger.exception(f"Error converting user to JSON: {str(e)}")
             user_json = '{}'
@@ -295,7 +427,7 @@ class RenderController:
         Args:
             method: HTTP method
             url: API URL
-            **kwargs: Additional arguments for requests
+            **kwargs: Additional arguments for httpx
             
         Returns:
             Response object
@@ -318,14 +450,12 @@ class RenderController:
             try:
                 with self.app.test_client() as client:
                     # Convert headers to WSGI format
-                    environ_headers = {f'HTTP_{k.upper().replace("-", "_")}': v for k, v in headers.items()}
+                    environ_headers = {'HTTP_' + k.translate(_DASH_TO_UNDERSCORE).upper(): v for k, v in headers.items()}
                     if method == 'GET':
                         response = client.get(url, headers=headers, environ_base=environ_headers)
                         return MockResponse(response.status_code, response.data)
                     elif method == 'POST':
-                        json_data = kwargs.get('json')
-                        data = kwargs.get('data')
-                        response = client.post(url, json=json_data, data=data, headers=headers, environ_base=environ_headers)
+                        response = client.post(url, json=kwargs.get('json'), data=kwargs.get('data'), headers=headers, environ_base=environ_headers)
                         return MockResponse(response.status_code, response.data)
                     else:
                         # For other methods like PUT, DELETE, etc.
@@ -339,46 +469,46 @@ class RenderController:
             full_url = url
         else:
             # Replace /api with appropriate service URL based on the endpoint
-            if url.startswith('/api/chats'):
-                service_url = os.environ.get('CHAT_SERVICE_URL', 'http://localhost:5504')
-                full_url = service_url + url.replace('/api/chats', '/chats')
-            elif url.startswith('/api/users'):
-                service_url = os.environ.get('USER_SERVICE_URL', 'http://localhost:5502')
-                full_url = service_url + url.replace('/api/users', '/users')
-            elif url.startswith('/api/auth'):
-                service_url = os.environ.get('AUTH_SERVICE_URL', 'http://localhost:5501')
-                full_url = service_url + url.replace('/api/auth', '/auth')
+            for prefix, env_var, default_url, service_path in _SERVICE_ROUTES:
+                if url.startswith(prefix):
+                    full_url = _resolve_service_base(env_var, default_url) + service_path + url[len(prefix):]
+                    break
             else:
                 # Default case - use API base URL with the provided path
-                api_base_url = os.environ.get('API_BASE_URL', 'http://localhost:5000')
-                full_url = api_base_url + url
+                full_url = _resolve_service_base('API_BASE_URL', 'http://localhost:5000') + url
         
         try:
             # Make the request with a timeout to avoid long delays
-            return requests.request(method, full_url, timeout=timeout, **kwargs)
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            return _http_client.request(method, full_url, timeout=timeout, **kwargs)
+        except (httpx.ConnectError, httpx.TimeoutException) as e:
             logger.error(f"Connection error to {full_url}: {str(e)}")
             # Create a mock response with error status
-            return MockResponse(503, json.dumps({"error": "Service unavailable"}))
+            return MockResponse(503, _SERVICE_UNAVAILABLE_BODY)
         except Exception as e:
             logger.error(f"Error making request to {full_url}: {str(e)}")
-            return MockResponse(500, json.dumps({"error": str(e)}))
+            return MockResponse(500, orjson.dumps({"error": str(e)}))
 
 
 class MockResponse:
     """Mock response object for when microservices are unavailable"""
     
+    _UNPARSED = object()
+    
     def __init__(self, status_code, content):
         self.status_code = status_code
+        # Normalize content to bytes so there is a single parse path
+        if isinstance(content, dict):
+            content = orjson.dumps(content)
+        elif isinstance(content, str):
+            content = content.encode('utf-8')
         self._content = content
+        self._parsed = self._UNPARSED
         
     def json(self):
-        """Parse response content as JSON"""
-        if isinstance(self._content, dict):
-            return self._content
-        if isinstance(self._content, bytes):
-            return json.loads(self._content.decode('utf-8'))
-        return json.loads(self._content)
+        """Parse response content as JSON, once"""
+        if self._parsed is self._UNPARSED:
+            self._parsed = orjson.loads(self._content)
+        return self._parsed
 
 # Initialize controller
 render_controller = RenderController() 
\ No newline at end of file
@@ -13,6 +13,10 @@ logger = logging.getLogger(__name__)
 # Create a blueprint for user routes
 user_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
+# Mock unread counts as (chat_id, count, age in seconds), built once at import
+_MOCK_UNREAD = tuple((f"chat_{i}", i, i * 3600) for i in range(1, 4))
+_MOCK_UNREAD_TOTAL = sum(count for _, count, _ in _MOCK_UNREAD)
+
 class UserController:
     """Controller to handle user-related routes and logic"""
     
@@ -108,19 +112,18 @@ class UserController:
             
             # Generate random data for demonstration
             # In a real app, this would be actual unread counts from a database
+            now = time.time()
             mock_chats = {
-                f"chat_{i}": {
-                    "count": i,
-                    "last_message_time": time.time() - (i * 3600)
-                } for i in range(1, 4)
+                chat_id: {
+                    "count": count,
+                    "last_message_time": now - age
+                } for chat_id, count, age in _MOCK_UNREAD
             }
             
-            total_count = sum(chat["count"] for chat in mock_chats.values())
-            
             return jsonify({
-                'count': total_count,
+                'count': _MOCK_UNREAD_TOTAL,
                 'chats': mock_chats,
-                'updated_at': time.time()
+                'updated_at': now
             })
         except Exception as e:
             logger.exception(f"Error in get_unread_count: {str(e)}")
@@ -5,14 +5,14 @@ Provides authentication endpoints for ABDRE Chat
 
 import os
 import logging
-import threading
-import time
-from flask import Flask
-from flask_cors import CORS
+import orjson
+from apscheduler.schedulers.background import BackgroundScheduler
+from flask import Flask, request
+from flask.json.provider import DefaultJSONProvider
 from pathlib import Path
 
 from .routes import auth_routes
-from .models import SessionManager, TokenBlacklist
+from .models import SessionManager, TokenBlacklist, BLACKLIST_REFRESH_SECONDS, SESSION_ACTIVITY_WRITE_INTERVAL
 
 # Setup logging
 logging.basicConfig(
@@ -24,10 +24,43 @@ logger = logging.getLogger(__name__)
 # Constants
 SERVICE_NAME = "auth-service"
 SERVICE_PORT = int(os.environ.get("AUTH_SERVICE_PORT", 5501))
+MAX_REQUEST_BYTES = 16 * 1024  # Auth requests are small JSON bodies
+
+# CORS headers for /api/* responses, built once. Any origin is allowed; since
+# credentials are supported the request Origin is echoed instead of '*'.
+_CORS_HEADERS = {
+    'Access-Control-Allow-Credentials': 'true',
+    'Vary': 'Origin'
+}
+_CORS_PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Methods': 'DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT'
+}
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes and decodes with orjson
+    
+    Datetimes are passed through to Flask's default handler so responses keep
+    the same HTTP-date format as the stdlib provider, and keys stay sorted.
+    """
+    
+    def dumps(self, obj, **kwargs):
+        """Serialize obj to a JSON string"""
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        """Deserialize a JSON string or bytes"""
+        return orjson.loads(s)
 
 def create_app():
     """Create and configure the Flask application"""
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     
     # Configure app
     app.config.update(
@@ -36,13 +69,27 @@ def create_app():
         ENV=os.environ.get('FLASK_ENV', 'development'),
         JWT_SECRET=os.environ.get('JWT_SECRET', 'your-secret-key-here'),
         ADMIN_SECRET=os.environ.get('ADMIN_SECRET', 'admin-secret-token'),
-        SESSION_CLEANUP_INTERVAL=int(os.environ.get('SESSION_CLEANUP_INTERVAL', 3600))  # 1 hour
+        SESSION_CLEANUP_INTERVAL=int(os.environ.get('SESSION_CLEANUP_INTERVAL', 3600)),  # 1 hour
+        MAX_CONTENT_LENGTH=MAX_REQUEST_BYTES  # Larger bodies are rejected with 413
     )
     
     # Setup CORS
-    CORS(app, 
-         resources={r"/api/*": {"origins": "*"}},
-         supports_credentials=True)
+    @app.after_request
+    def add_cors_headers(response):
+        """Add precomputed CORS headers to API responses"""
+        origin = request.headers.get('Origin')
+        if origin and request.path.startswith('/api/'):
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers.update(_CORS_HEADERS)
+            
+            # Preflight requests are answered by Flask's automatic OPTIONS handling
+            if request.method == 'OPTIONS':
+                response.headers.update(_CORS_PREFLIGHT_HEADERS)
+                requested_headers = request.headers.get('Access-Control-Request-Headers')
+                if requested_headers:
+                    response.headers['Access-Control-Allow-Headers'] = requested_headers
+        
+        return response
     
     # Register routes with prefix
     app.register_blueprint(auth_routes, url_prefix='/api/auth')
@@ -60,36 +107,38 @@ def create_app():
     data_dir = Path(__file__).parent / "data"
     data_dir.mkdir(exist_ok=True)
     
-    # Start maintenance thread for cleaning up expired sessions and tokens
-    _start_maintenance_thread(app)
+    # Schedule maintenance job for cleaning up expired sessions and tokens
+    _start_maintenance_scheduler(app)
     
     return app
 
-def _start_maintenance_thread(app):
-    """Start maintenance thread for periodic cleanup"""
+def _start_maintenance_scheduler(app):
+    """Start background scheduler for periodic cleanup"""
     cleanup_interval = app.config.get('SESSION_CLEANUP_INTERVAL', 3600)  # Default 1 hour
     
     def maintenance_task():
         """Periodic maintenance task"""
-        while True:
-            try:
-                # Wait for interval
-                time.sleep(cleanup_interval)
-                
-                # Clean up expired sessions
-                with app.app_context():
-                    logger.info("Running maintenance task: Cleaning up expired sessions and tokens")
-                    sessions_removed = SessionManager.cleanup_expired_sessions()
-                    blacklist_removed = TokenBlacklist.cleanup_expired_entries()
-                    logger.info(f"Maintenance complete: Removed {sessions_removed} expired sessions and {blacklist_removed} expired blacklist entries")
-            
-            except Exception as e:
-                logger.error(f"Error in maintenance thread: {str(e)}")
+        try:
+            # Clean up expired sessions
+            logger.info("Running maintenance task: Cleaning up expired sessions and tokens")
+            sessions_removed = SessionManager.cleanup_expired_sessions()
+            blacklist_removed = TokenBlacklist.cleanup_expired_entries()
+            logger.info(f"Maintenance complete: Removed {sessions_removed} expired sessions and {blacklist_removed} expired blacklist entries")
+        
+        except Exception as e:
+            logger.error(f"Error in maintenance task: {str(e)}")
     
-    # Start thread as daemon so it will exit when the main process exits
-    maintenance_thread = threading.Thread(target=maintenance_task, daemon=True)
-    maintenance_thread.start()
-    logger.info(f"Started maintenance thread with {cleanup_interval}s interval")
+    # A single daemon scheduler thread runs all maintenance jobs
+    scheduler = BackgroundScheduler(daemon=True)
+    scheduler.add_job(maintenance_task, 'interval', seconds=cleanup_interval,
+                      id='maintenance', coalesce=True, max_instances=1)
+    scheduler.add_job(TokenBlacklist.refresh_cache, 'interval', seconds=BLACKLIST_REFRESH_SECONDS,
+                      id='blacklist_refresh', coalesce=True, max_instances=1)
+    scheduler.add_job(SessionManager.flush_session_activity, 'interval', seconds=SESSION_ACTIVITY_WRITE_INTERVAL,
+                      id='session_activity_flush', coalesce=True, max_instances=1)
+    scheduler.start()
+    app.extensions['maintenance_scheduler'] = scheduler
+    logger.info(f"Started maintenance scheduler with {cleanup_interval}s interval")
 
 def run_service():
     """Run the Auth Service"""
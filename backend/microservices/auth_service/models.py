@@ -7,16 +7,41 @@ import uuid
 from datetime import datetime, timedelta
 import jwt
 import os
-import json
+import time
+import hmac
+import base64
+import atexit
+import calendar
 import logging
 import hashlib
+import tempfile
+import threading
+import orjson
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
+from .store import SQLiteStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: stores are only locked within the process
+    fcntl = None
+
 # Setup logging
 logger = logging.getLogger(__name__)
 
 # JWT Secret key - should be stored in environment variable in production
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-here')
+JWT_SECRET_BYTES = JWT_SECRET.encode('utf-8')
+
+# Every token uses the same header, so its base64url segment is computed once
+_JWT_HEADER_SEGMENT = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=')
+
+# Guest tokens always carry the same claims, so their payload is filled into a
+# fixed template (visitor_id, exp, iat, jti) instead of serializing a dict
+_GUEST_PAYLOAD_TEMPLATE = b'{"visitor_id":%b,"is_guest":true,"exp":%d,"iat":%d,"jti":"%b"}'
 
 # Path to database files
 DATA_DIR = Path(__file__).parent / "data"
@@ -24,10 +49,468 @@ USER_DB_FILE = DATA_DIR / "users.json"
 SESSION_DB_FILE = DATA_DIR / "sessions.json"
 BLACKLIST_DB_FILE = DATA_DIR / "token_blacklist.json"
 AUTH_LOG_FILE = DATA_DIR / "auth_logs.json"
+AUTH_DB_FILE = DATA_DIR / "auth.db"
 
 # Ensure data directory exists
 DATA_DIR.mkdir(exist_ok=True)
 
+# Buffered store writes are flushed after this many seconds
+WRITE_COALESCE_SECONDS = 0.5
+
+# The append log is compacted into the snapshot once it outgrows it by this factor
+COMPACT_RATIO = 4
+COMPACT_MIN_BYTES = 64 * 1024
+
+
+def _atomic_write(path, data, fsync=True):
+    """
+    Replace a file atomically so readers never see a partial write
+    
+    Args:
+        path (Path): File to write
+        data (bytes): New contents
+        fsync (bool): Flush to disk before the rename; low-value files can skip it
+    """
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, suffix='.tmp', delete=False) as tmp:
+        try:
+            tmp.write(data)
+            if fsync:
+                tmp.flush()
+                os.fsync(tmp.fileno())
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    # NamedTemporaryFile creates 0600 files; keep the usual data file mode
+    os.chmod(tmp.name, 0o644)
+    os.replace(tmp.name, path)
+
+
+@contextmanager
+def _locked(path, exclusive=True):
+    """
+    Hold an advisory flock on a sibling .lock file for cross-process safety
+    
+    Args:
+        path (Path): Data file to lock
+        exclusive (bool): Take an exclusive lock instead of a shared one
+    """
+    if fcntl is None:
+        yield
+        return
+    
+    fd = os.open(path.with_suffix('.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+class _AppendStore:
+    """
+    Keyed record store backed by a JSON snapshot plus an append-only JSONL log
+    
+    Each mutation is one compact JSON line ({"k": key, "v": record} for an
+    upsert, {"_del": key} for a delete). Lines are buffered for
+    WRITE_COALESCE_SECONDS so a burst of writes costs a single os.write, and
+    the log is folded back into the snapshot once it grows too large.
+    
+    Parsed records are kept in memory and only re-read when the mtime or size
+    of either file changes, e.g. after a write from another process. Disk
+    access is serialized across worker processes with _locked().
+    """
+    
+    def __init__(self, snapshot_path, key_field=None):
+        """
+        Initialize the store
+        
+        Args:
+            snapshot_path (Path): JSON snapshot file; the log sits next to it as .jsonl
+            key_field (str): If set, the snapshot is a list of records keyed by
+                this field; otherwise it is a dict keyed by record ID
+        """
+        self.snapshot_path = snapshot_path
+        self.log_path = snapshot_path.with_suffix('.jsonl')
+        self.key_field = key_field
+        self._pending = []
+        self._flush_timer = None
+        self._data = None
+        self._stamp = None
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+    
+    def load(self):
+        """
+        Load all records
+        
+        Returns:
+            dict: Records keyed by ID, including writes not yet flushed. The
+                dict is shared and must be treated as read-only.
+        """
+        with self._lock:
+            if self._data is None or self._disk_stamp() != self._stamp:
+                # Shared lock so a concurrent compaction is never seen half-done
+                with _locked(self.snapshot_path, exclusive=False):
+                    self._stamp = self._disk_stamp()
+                    self._data = self._read_disk()
+            return self._data
+    
+    def put(self, key, record):
+        """Insert or replace a record"""
+        self._append([{'k': key, 'v': record}])
+    
+    def delete(self, key):
+        """Delete a record"""
+        self._append([{'_del': key}])
+    
+    def delete_many(self, keys):
+        """Delete several records in one buffered write"""
+        self._append([{'_del': key} for key in keys])
+    
+    def replace_all(self, data):
+        """
+        Replace the whole store with a fresh snapshot and an empty log
+        
+        Args:
+            data (dict): Records keyed by ID
+        """
+        with self._lock, _locked(self.snapshot_path):
+            self._cancel_flush()
+            self._pending = []
+            self._write_snapshot(data)
+            self.log_path.write_bytes(b'')
+            self._data = dict(data)
+            self._stamp = self._disk_stamp()
+    
+    def flush(self):
+        """Write buffered mutations to the append log"""
+        with self._lock:
+            self._flush_timer = None
+            if not self._pending:
+                return
+            
+            lines = b''.join(
+                orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE)
+                for entry in self._pending
+            )
+            
+            try:
+                with _locked(self.snapshot_path):
+                    # Only trust the cache afterwards if nobody else wrote in between
+                    unchanged = self._disk_stamp() == self._stamp
+                    
+                    fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    try:
+                        os.write(fd, lines)
+                    finally:
+                        os.close(fd)
+                    self._pending = []
+                    self._stamp = self._disk_stamp() if unchanged else None
+                    self._maybe_compact()
+            except Exception as e:
+                logger.error(f"Error flushing {self.log_path.name}: {str(e)}")
+    
+    def _append(self, entries):
+        """Buffer entries, apply them to the cache and schedule a flush"""
+        with self._lock:
+            # Copy on write so readers iterating the previous dict are unaffected
+            data = dict(self.load())
+            self._apply(data, entries)
+            self._data = data
+            self._pending.extend(entries)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(WRITE_COALESCE_SECONDS, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def _cancel_flush(self):
+        """Cancel a scheduled flush"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+    
+    def _maybe_compact(self):
+        """
+        Fold the log into a new snapshot once it outgrows the snapshot
+        
+        Must be called with the exclusive store lock held.
+        """
+        log_size = self.log_path.stat().st_size
+        snapshot_size = self.snapshot_path.stat().st_size if self.snapshot_path.exists() else 0
+        
+        if log_size > max(COMPACT_MIN_BYTES, COMPACT_RATIO * snapshot_size):
+            data = self._data if self._stamp is not None else self._read_disk()
+            self._write_snapshot(data)
+            self.log_path.write_bytes(b'')
+            self._data = data
+            self._stamp = self._disk_stamp()
+    
+    def _disk_stamp(self):
+        """Return the (mtime, size) of the snapshot and log files"""
+        stamp = []
+        for path in (self.snapshot_path, self.log_path):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+    
+    def _read_disk(self):
+        """Read snapshot and log from disk and re-apply unflushed writes"""
+        data = self._read_snapshot()
+        self._apply(data, self._read_log())
+        self._apply(data, self._pending)
+        return data
+    
+    @staticmethod
+    def _apply(data, entries):
+        """Apply upsert/delete entries to a records dict in order"""
+        for entry in entries:
+            if '_del' in entry:
+                data.pop(entry['_del'], None)
+            else:
+                data[entry['k']] = entry['v']
+    
+    def _read_snapshot(self):
+        """Read the snapshot file into a records dict"""
+        if not self.snapshot_path.exists():
+            return {}
+        
+        try:
+            snapshot = orjson.loads(self.snapshot_path.read_bytes())
+        except (orjson.JSONDecodeError, FileNotFoundError) as e:
+            logger.error(f"Error loading {self.snapshot_path.name}: {str(e)}")
+            return {}
+        
+        if self.key_field:
+            return {record[self.key_field]: record for record in snapshot}
+        return snapshot
+    
+    def _read_log(self):
+        """Read the append log, skipping torn or corrupt lines"""
+        if not self.log_path.exists():
+            return []
+        
+        entries = []
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                try:
+                    entries.append(orjson.loads(line))
+                except ValueError:
+                    logger.warning(f"Skipping corrupt line in {self.log_path.name}")
+        return entries
+    
+    def _write_snapshot(self, data):
+        """Write a records dict as the snapshot file"""
+        snapshot = list(data.values()) if self.key_field else data
+        # The user snapshot stays indented so it remains readable by hand
+        _atomic_write(
+            self.snapshot_path,
+            orjson.dumps(snapshot, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+        )
+
+
+def _to_timestamp(value):
+    """
+    Normalize a stored expiry to a Unix timestamp
+    
+    Expiries are stored as ints; naive UTC ISO strings written before that
+    are still accepted.
+    """
+    if isinstance(value, int):
+        return value
+    return calendar.timegm(datetime.fromisoformat(value).utctimetuple())
+
+
+def expiry_to_iso(value):
+    """
+    Format a stored expiry as a naive UTC ISO string for API responses
+    
+    Args:
+        value (int|str): Unix timestamp or legacy ISO string
+        
+    Returns:
+        str: ISO formatted time
+    """
+    if isinstance(value, int):
+        return datetime.utcfromtimestamp(value).isoformat()
+    return value
+
+
+def _import_legacy_store(path, table, user_field=None):
+    """
+    Import a JSON sessions/blacklist file into an empty SQLite table
+    
+    Args:
+        path (Path): Legacy JSON snapshot (its .jsonl log is read as well)
+        table (str): Destination table
+        user_field (str): Record field holding the owning user ID
+    """
+    if _auth_db.count(table) or not (path.exists() or path.with_suffix('.jsonl').exists()):
+        return
+    
+    records = _AppendStore(path).load()
+    _auth_db.replace_all(table, (
+        (key, record, _to_timestamp(record['expires_at']), record.get(user_field) if user_field else None)
+        for key, record in records.items()
+    ))
+    logger.info(f"Imported {len(records)} records from {path.name} into {table}")
+
+
+_user_store = _AppendStore(USER_DB_FILE, key_field='user_id')
+
+# Sessions and blacklisted tokens live in SQLite
+_auth_db = SQLiteStore(AUTH_DB_FILE)
+_import_legacy_store(SESSION_DB_FILE, 'sessions', user_field='user_id')
+_import_legacy_store(BLACKLIST_DB_FILE, 'blacklist')
+
+def _b64url_encode(data):
+    """Base64url-encode bytes without padding"""
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _b64url_decode(segment):
+    """Base64url-decode an unpadded segment"""
+    return base64.urlsafe_b64decode(segment + b'=' * (-len(segment) % 4))
+
+
+def token_digest(token):
+    """
+    Fingerprint a token for storage
+    
+    Args:
+        token (str): Encoded token
+        
+    Returns:
+        str: Base64 SHA-256 digest (44 chars instead of 64 hex chars)
+    """
+    return base64.b64encode(hashlib.sha256(token.encode('ascii')).digest()).decode('ascii')
+
+
+def encode_token(payload):
+    """
+    Encode an HS256 JWT
+    
+    Produces the same tokens as jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+    without PyJWT's per-call algorithm lookup and option handling.
+    
+    Args:
+        payload (dict): Claims; datetime values are converted to UTC timestamps
+        
+    Returns:
+        str: Encoded token
+    """
+    claims = {
+        key: calendar.timegm(value.utctimetuple()) if isinstance(value, datetime) else value
+        for key, value in payload.items()
+    }
+    return _sign_payload(orjson.dumps(claims))
+
+
+def _sign_payload(payload_json):
+    """Build a signed HS256 token from serialized claims"""
+    signing_input = _JWT_HEADER_SEGMENT + b'.' + _b64url_encode(payload_json)
+    signature = hmac.digest(JWT_SECRET_BYTES, signing_input, 'sha256')
+    return (signing_input + b'.' + _b64url_encode(signature)).decode('ascii')
+
+
+def decode_token(token, verify=True):
+    """
+    Decode an HS256 JWT
+    
+    Raises the same jwt exceptions as jwt.decode so existing handlers keep working.
+    
+    Args:
+        token (str): Encoded token
+        verify (bool): Check the signature and time claims
+        
+    Returns:
+        dict: Token payload
+    """
+    try:
+        signing_input, signature_segment = token.encode('ascii').rsplit(b'.', 1)
+        header_segment, payload_segment = signing_input.split(b'.', 1)
+        header = orjson.loads(_b64url_decode(header_segment))
+        payload = orjson.loads(_b64url_decode(payload_segment))
+        signature = _b64url_decode(signature_segment)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise jwt.DecodeError(f"Invalid token: {str(e)}")
+    
+    if not isinstance(header, dict) or not isinstance(payload, dict):
+        raise jwt.DecodeError("Invalid token: header and payload must be JSON objects")
+    
+    if not verify:
+        return payload
+    
+    if header.get('alg') != 'HS256':
+        raise jwt.InvalidAlgorithmError("The specified alg value is not allowed")
+    
+    expected = hmac.digest(JWT_SECRET_BYTES, signing_input, 'sha256')
+    if not hmac.compare_digest(signature, expected):
+        raise jwt.InvalidSignatureError("Signature verification failed")
+    
+    now = time.time()
+    exp = payload.get('exp')
+    if exp is not None:
+        if not isinstance(exp, (int, float)):
+            raise jwt.DecodeError("Expiration Time claim (exp) must be an integer.")
+        if exp <= now:
+            raise jwt.ExpiredSignatureError("Signature has expired")
+    
+    nbf = payload.get('nbf')
+    if isinstance(nbf, (int, float)) and nbf > now:
+        raise jwt.ImmatureSignatureError("The token is not yet valid (nbf)")
+    
+    return payload
+
+
+@lru_cache(maxsize=4096)
+def unverified_claims(token):
+    """
+    Read a token's claims without verifying it, memoized per token string
+    
+    Used where only the jti/exp/user_id of a token being revoked is needed.
+    The returned dict is shared between callers and must not be modified.
+    
+    Args:
+        token (str): Encoded token
+        
+    Returns:
+        dict: Token payload
+    """
+    return decode_token(token, verify=False)
+
+
+# Username and email indexes over the user store, rebuilt when the store reloads
+_user_index = {'source': None, 'by_username': {}, 'by_email': {}}
+_user_index_lock = threading.Lock()
+
+# API dicts built from stored user records; saving a user stores a new record
+# object, so an entry is valid only while its record is still the stored one
+_user_dict_cache = {}  # user_id -> (record, to_dict() result)
+
+# Auth event log: the newest entries are kept in memory and flushed on a timer
+AUTH_LOG_MAX_ENTRIES = 1000
+_auth_log = {'entries': None, 'flush_timer': None}
+_auth_log_lock = threading.RLock()
+# Serializes file writes so they can run without holding _auth_log_lock
+_auth_log_write_lock = threading.Lock()
+
+# Session last_activity is persisted at most once per interval per session;
+# touches in between are held in memory and written by a periodic flush
+SESSION_ACTIVITY_WRITE_INTERVAL = 60
+_session_activity = {'written': {}, 'pending': {}}
+_session_activity_lock = threading.Lock()
+
+# In-memory mirror of blacklisted JTIs. Local revocations are added directly;
+# revocations from other processes are picked up by the periodic refresh.
+BLACKLIST_REFRESH_SECONDS = 60
+_blacklist_mirror = {'jtis': None}
+_blacklist_mirror_lock = threading.Lock()
+
 class User:
     """User model with authentication methods"""
     
@@ -89,45 +572,69 @@ class User:
     @classmethod
     def get_by_username(cls, username):
         """Get user by username"""
-        users = UserDatabase.load_users()
-        for user_data in users:
-            if user_data['username'] == username:
-                return cls.from_json(user_data)
-        return None
+        user_data = UserDatabase.get_indexes()[1].get(username)
+        return cls.from_json(user_data) if user_data else None
     
     @classmethod
     def get_by_email(cls, email):
         """Get user by email"""
-        users = UserDatabase.load_users()
-        for user_data in users:
-            if user_data['email'] == email:
-                return cls.from_json(user_data)
-        return None
+        user_data = UserDatabase.get_indexes()[2].get(email)
+        return cls.from_json(user_data) if user_data else None
+    
+    @classmethod
+    def get_dict_by_id(cls, user_id):
+        """
+        Get the API representation of a user by ID
+        
+        The dict is built once per stored record and reused until the user is
+        saved again. Callers must treat it as read-only.
+        
+        Args:
+            user_id (str): User ID
+            
+        Returns:
+            dict: Same fields as User.to_dict(), or None if not found
+        """
+        record = UserDatabase.get_indexes()[0].get(user_id)
+        if not record:
+            return None
+        
+        cached = _user_dict_cache.get(user_id)
+        if cached is not None and cached[0] is record:
+            return cached[1]
+        
+        user_dict = cls.from_json(record).to_dict()
+        _user_dict_cache[user_id] = (record, user_dict)
+        return user_dict
+    
+    @classmethod
+    def get_by_identifier(cls, identifier):
+        """
+        Get user by username, or by email if the identifier looks like one
+        
+        Both lookups are served from a single snapshot of the indexes.
+        
+        Args:
+            identifier (str): Username or email address
+            
+        Returns:
+            User: Matching user or None
+        """
+        _, by_username, by_email = UserDatabase.get_indexes()
+        user_data = by_username.get(identifier)
+        if user_data is None and '@' in identifier:
+            user_data = by_email.get(identifier)
+        return cls.from_json(user_data) if user_data else None
     
     @classmethod
     def get_by_id(cls, user_id):
         """Get user by ID"""
-        users = UserDatabase.load_users()
-        for user_data in users:
-            if user_data['user_id'] == user_id:
-                return cls.from_json(user_data)
-        return None
+        user_data = UserDatabase.get_indexes()[0].get(user_id)
+        return cls.from_json(user_data) if user_data else None
     
     def save(self):
         """Save user to database"""
-        users = UserDatabase.load_users()
-        
-        # Check if user already exists
-        for i, user_data in enumerate(users):
-            if user_data['user_id'] == self.user_id:
-                # Update existing user
-                users[i] = self.to_json()
-                UserDatabase.save_users(users)
-                return self
-        
-        # Add new user
-        users.append(self.to_json())
-        UserDatabase.save_users(users)
+        UserDatabase.save_user(self.to_json())
         return self
     
     def generate_auth_token(self, expiration=86400, device_info=None):
@@ -153,15 +660,14 @@ class User:
         }
         
         # Create token
-        token = jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+        token = encode_token(payload)
         
         # Record session
         session_id = payload['jti']
         SessionManager.create_session(
             session_id=session_id,
             user_id=self.user_id,
-            token=token,
-            expires_at=exp_time.isoformat(),
+            expires_at=calendar.timegm(exp_time.utctimetuple()),
             device_info=device_info or {}
         )
         
@@ -179,16 +685,16 @@ class User:
             dict: Token payload if valid, None otherwise
         """
         try:
+            # Decode and verify token
+            payload = decode_token(token)
+            
             # Check if token is blacklisted
-            if TokenBlacklist.is_blacklisted(token):
+            session_id = payload.get('jti')
+            if session_id and TokenBlacklist.is_jti_blacklisted(session_id):
                 logger.warning("Token is blacklisted")
                 return None
             
-            # Decode and verify token
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-            
             # Check if this session exists
-            session_id = payload.get('jti')
             if session_id and not SessionManager.session_exists(session_id):
                 logger.warning("Session not found for token")
                 return None
@@ -233,29 +739,24 @@ class Guest:
         Returns:
             tuple: (token, expiration_time)
         """
-        exp_time = datetime.utcnow() + timedelta(seconds=expiration)
+        issued_at = int(time.time())
+        expires_at = issued_at + expiration
+        session_id = str(uuid.uuid4())  # JWT ID for tracking/revocation
         
-        payload = {
-            'visitor_id': self.visitor_id,
-            'is_guest': True,
-            'exp': exp_time,
-            'iat': datetime.utcnow(),  # Issued at
-            'jti': str(uuid.uuid4())   # JWT ID for tracking/revocation
-        }
-        
-        token = jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+        # Same claims as a generic encode_token call, filled into the template
+        token = _sign_payload(_GUEST_PAYLOAD_TEMPLATE % (
+            orjson.dumps(self.visitor_id), expires_at, issued_at, session_id.encode('ascii')
+        ))
         
         # Record session
-        session_id = payload['jti']
         SessionManager.create_session(
             session_id=session_id,
             user_id=f"guest:{self.visitor_id}",
-            token=token,
-            expires_at=exp_time.isoformat(),
+            expires_at=expires_at,
             device_info=device_info or {}
         )
         
-        return token, exp_time
+        return token, datetime.utcfromtimestamp(expires_at)
 
 
 class UserDatabase:
@@ -264,37 +765,71 @@ class UserDatabase:
     @staticmethod
     def load_users():
         """Load users from database file"""
-        if not USER_DB_FILE.exists():
-            return []
-        
-        try:
-            with open(USER_DB_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"Error loading user database: {str(e)}")
-            return []
+        return list(_user_store.load().values())
     
     @staticmethod
     def save_users(users):
-        """Save users to database file"""
+        """Replace the user database with the given users"""
         try:
-            with open(USER_DB_FILE, 'w') as f:
-                json.dump(users, f, indent=2)
+            _user_store.replace_all({user['user_id']: user for user in users})
         except Exception as e:
             logger.error(f"Error saving user database: {str(e)}")
             raise
+    
+    @staticmethod
+    def save_user(user_data):
+        """Insert or update a single user record"""
+        with _user_index_lock:
+            by_id, by_username, by_email = UserDatabase._indexes_locked()
+            previous = by_id.get(user_data['user_id'])
+            
+            _user_store.put(user_data['user_id'], user_data)
+            
+            # Update the indexes in place rather than rebuilding them
+            if previous is not None:
+                if by_username.get(previous['username']) is previous:
+                    del by_username[previous['username']]
+                if by_email.get(previous['email']) is previous:
+                    del by_email[previous['email']]
+            by_username.setdefault(user_data['username'], user_data)
+            by_email.setdefault(user_data['email'], user_data)
+            _user_index['source'] = _user_store.load()
+    
+    @staticmethod
+    def get_indexes():
+        """
+        Get user lookup indexes
+        
+        Returns:
+            tuple: (by_id, by_username, by_email) dicts of user records
+        """
+        with _user_index_lock:
+            return UserDatabase._indexes_locked()
+    
+    @staticmethod
+    def _indexes_locked():
+        """Return the indexes, rebuilding them if the user store was reloaded"""
+        users = _user_store.load()
+        
+        if users is not _user_index['source']:
+            by_username = {}
+            by_email = {}
+            for user in users.values():
+                by_username.setdefault(user['username'], user)
+                by_email.setdefault(user['email'], user)
+            _user_index.update(source=users, by_username=by_username, by_email=by_email)
+        
+        return users, _user_index['by_username'], _user_index['by_email']
 
     @staticmethod
     def username_exists(username):
         """Check if username exists"""
-        users = UserDatabase.load_users()
-        return any(user['username'] == username for user in users)
+        return username in UserDatabase.get_indexes()[1]
     
     @staticmethod
     def email_exists(email):
         """Check if email exists"""
-        users = UserDatabase.load_users()
-        return any(user['email'] == email for user in users)
+        return email in UserDatabase.get_indexes()[2]
 
 
 class SessionManager:
@@ -302,56 +837,45 @@ class SessionManager:
     
     @staticmethod
     def load_sessions():
-        """Load sessions from database file"""
-        if not SESSION_DB_FILE.exists():
-            return {}
-        
-        try:
-            with open(SESSION_DB_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"Error loading session database: {str(e)}")
-            return {}
+        """Load all sessions from the database"""
+        return _auth_db.all('sessions')
     
     @staticmethod
     def save_sessions(sessions):
-        """Save sessions to database file"""
+        """Replace the session database with the given sessions"""
         try:
-            with open(SESSION_DB_FILE, 'w') as f:
-                json.dump(sessions, f, indent=2)
+            _auth_db.replace_all('sessions', (
+                (session_id, session, _to_timestamp(session['expires_at']), session['user_id'])
+                for session_id, session in sessions.items()
+            ))
         except Exception as e:
             logger.error(f"Error saving session database: {str(e)}")
             raise
     
     @staticmethod
-    def create_session(session_id, user_id, token, expires_at, device_info=None):
+    def create_session(session_id, user_id, expires_at, device_info=None):
         """
         Create a new session
         
         Args:
             session_id (str): Session ID
             user_id (str): User ID
-            token (str): JWT token
-            expires_at (str): Expiration time ISO format
+            expires_at (int): Expiration time as a Unix timestamp
             device_info (dict): Device information
             
         Returns:
             bool: Success or failure
         """
-        sessions = SessionManager.load_sessions()
-        
         # Create new session
-        sessions[session_id] = {
+        session = {
             'session_id': session_id,
             'user_id': user_id,
-            'token_hash': hashlib.sha256(token.encode()).hexdigest() if token else None,
             'created_at': datetime.utcnow().isoformat(),
             'expires_at': expires_at,
             'device_info': device_info or {},
             'last_activity': datetime.utcnow().isoformat()
         }
-        
-        SessionManager.save_sessions(sessions)
+        _auth_db.put('sessions', session_id, session, expires_at, user_id=user_id)
         return True
     
     @staticmethod
@@ -365,19 +889,15 @@ class SessionManager:
         Returns:
             bool: True if session exists and is valid
         """
-        sessions = SessionManager.load_sessions()
+        session = _auth_db.get('sessions', session_id)
         
-        if session_id not in sessions:
+        if session is None:
             return False
         
         # Check expiration
-        session = sessions[session_id]
-        expires_at = datetime.fromisoformat(session['expires_at'])
-        
-        if datetime.utcnow() > expires_at:
+        if time.time() > _to_timestamp(session['expires_at']):
             # Session has expired, remove it
-            del sessions[session_id]
-            SessionManager.save_sessions(sessions)
+            _auth_db.delete('sessions', session_id)
             return False
         
         return True
@@ -393,27 +913,83 @@ class SessionManager:
         Returns:
             dict: Session data or None if not found
         """
-        sessions = SessionManager.load_sessions()
-        return sessions.get(session_id)
+        return _auth_db.get('sessions', session_id)
+    
+    @staticmethod
+    def get_user_sessions(user_id):
+        """
+        Get all sessions for a user
+        
+        Args:
+            user_id (str): User ID
+            
+        Returns:
+            dict: Sessions keyed by session ID
+        """
+        return _auth_db.find_by_user('sessions', user_id)
     
     @staticmethod
     def update_session_activity(session_id):
         """
         Update session last activity time
         
+        Within SESSION_ACTIVITY_WRITE_INTERVAL of the last write for this
+        session the time is only recorded in memory for the next flush.
+        
         Args:
             session_id (str): Session ID
             
         Returns:
             bool: Success or failure
         """
-        sessions = SessionManager.load_sessions()
+        now = time.time()
+        
+        with _session_activity_lock:
+            last_written = _session_activity['written'].get(session_id)
+            if last_written is not None and now - last_written < SESSION_ACTIVITY_WRITE_INTERVAL:
+                _session_activity['pending'][session_id] = now
+                return True
+            _session_activity['written'][session_id] = now
+            _session_activity['pending'].pop(session_id, None)
+        
+        if SessionManager._write_activity(session_id, now):
+            return True
+        
+        with _session_activity_lock:
+            _session_activity['written'].pop(session_id, None)
+        return False
+    
+    @staticmethod
+    def flush_session_activity():
+        """
+        Persist activity times held in memory and forget idle sessions
         
-        if session_id not in sessions:
+        Returns:
+            int: Number of sessions written
+        """
+        now = time.time()
+        
+        with _session_activity_lock:
+            pending = _session_activity['pending']
+            _session_activity['pending'] = {}
+            written = _session_activity['written']
+            for session_id in [sid for sid, ts in written.items() if now - ts >= SESSION_ACTIVITY_WRITE_INTERVAL]:
+                del written[session_id]
+            written.update(pending)
+        
+        return sum(SessionManager._write_activity(sid, ts) for sid, ts in pending.items())
+    
+    @staticmethod
+    def _write_activity(session_id, timestamp):
+        """Write a session's last_activity time to the database"""
+        session = _auth_db.get('sessions', session_id)
+        
+        if session is None:
             return False
         
-        sessions[session_id]['last_activity'] = datetime.utcnow().isoformat()
-        SessionManager.save_sessions(sessions)
+        session['last_activity'] = datetime.utcfromtimestamp(timestamp).isoformat()
+        _auth_db.put('sessions', session_id, session, _to_timestamp(session['expires_at']),
+                     user_id=session['user_id'])
         return True
     
     @staticmethod
@@ -427,46 +1003,21 @@ class SessionManager:
         Returns:
             bool: Success or failure
         """
-        sessions = SessionManager.load_sessions()
-        
-        if session_id not in sessions:
-            return False
-        
-        # Get token before removing
-        session = sessions[session_id]
-        
-        # Remove session
-        del sessions[session_id]
-        SessionManager.save_sessions(sessions)
-        
-        return True
+        return _auth_db.delete('sessions', session_id)
     
     @staticmethod
-    def remove_user_sessions(user_id):
+    def remove_user_sessions(user_id, except_session_id=None):
         """
         Remove all sessions for a user
         
         Args:
             user_id (str): User ID
+            except_session_id (str): Session to keep, e.g. the caller's current one
             
         Returns:
             int: Number of sessions removed
         """
-        sessions = SessionManager.load_sessions()
-        
-        # Find sessions for this user
-        user_sessions = {
-            session_id: session
-            for session_id, session in sessions.items()
-            if session['user_id'] == user_id
-        }
-        
-        # Remove sessions
-        for session_id in user_sessions:
-            del sessions[session_id]
-        
-        SessionManager.save_sessions(sessions)
-        return len(user_sessions)
+        return _auth_db.delete_user('sessions', user_id, keep_key=except_session_id)
     
     @staticmethod
     def cleanup_expired_sessions():
@@ -476,21 +1027,7 @@ class SessionManager:
         Returns:
             int: Number of sessions removed
         """
-        sessions = SessionManager.load_sessions()
-        now = datetime.utcnow()
-        
-        expired_sessions = {
-            session_id: session
-            for session_id, session in sessions.items()
-            if datetime.fromisoformat(session['expires_at']) < now
-        }
-        
-        # Remove expired sessions
-        for session_id in expired_sessions:
-            del sessions[session_id]
-        
-        SessionManager.save_sessions(sessions)
-        return len(expired_sessions)
+        return _auth_db.delete_expired('sessions', int(time.time()))
 
 
 class TokenBlacklist:
@@ -498,42 +1035,37 @@ class TokenBlacklist:
     
     @staticmethod
     def load_blacklist():
-        """Load token blacklist from database file"""
-        if not BLACKLIST_DB_FILE.exists():
-            return {}
-        
-        try:
-            with open(BLACKLIST_DB_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"Error loading token blacklist: {str(e)}")
-            return {}
+        """Load the token blacklist from the database"""
+        return _auth_db.all('blacklist')
     
     @staticmethod
     def save_blacklist(blacklist):
-        """Save token blacklist to database file"""
+        """Replace the token blacklist with the given entries"""
         try:
-            with open(BLACKLIST_DB_FILE, 'w') as f:
-                json.dump(blacklist, f, indent=2)
+            _auth_db.replace_all('blacklist', (
+                (jti, entry, _to_timestamp(entry['expires_at']), None)
+                for jti, entry in blacklist.items()
+            ))
         except Exception as e:
             logger.error(f"Error saving token blacklist: {str(e)}")
             raise
     
     @staticmethod
-    def blacklist_token(token, reason="logout"):
+    def blacklist_token(token, reason="logout", claims=None):
         """
         Add a token to the blacklist
         
         Args:
             token (str): JWT token to blacklist
             reason (str): Reason for blacklisting
+            claims (dict): Already-decoded payload of token, to skip decoding it again
             
         Returns:
             bool: Success or failure
         """
         try:
             # Parse token to get expiration
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'], options={"verify_signature": False})
+            payload = claims if claims is not None else unverified_claims(token)
             jti = payload.get('jti')
             
             if not jti:
@@ -545,18 +1077,16 @@ class TokenBlacklist:
                 logger.warning("Token has no expiration, cannot blacklist")
                 return False
             
-            exp_time = datetime.fromtimestamp(exp)
-            
             # Add to blacklist
-            blacklist = TokenBlacklist.load_blacklist()
-            blacklist[jti] = {
-                'token_hash': hashlib.sha256(token.encode()).hexdigest(),
-                'expires_at': exp_time.isoformat(),
+            _auth_db.put('blacklist', jti, {
+                'token_hash': token_digest(token),
+                'expires_at': int(exp),
                 'blacklisted_at': datetime.utcnow().isoformat(),
                 'reason': reason
-            }
-            
-            TokenBlacklist.save_blacklist(blacklist)
+            }, int(exp))
+            with _blacklist_mirror_lock:
+                if _blacklist_mirror['jtis'] is not None:
+                    _blacklist_mirror['jtis'].add(jti)
             
             # Also remove the session
             SessionManager.remove_session(jti)
@@ -580,20 +1110,42 @@ class TokenBlacklist:
         """
         try:
             # Parse token to get JTI
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'], options={"verify_signature": False})
-            jti = payload.get('jti')
-            
-            if not jti:
-                # Token has no JTI, can't check blacklist
-                return False
-            
-            # Check blacklist
-            blacklist = TokenBlacklist.load_blacklist()
-            return jti in blacklist
-            
+            jti = unverified_claims(token).get('jti')
         except Exception as e:
             logger.error(f"Error checking token blacklist: {str(e)}")
             return False
+        
+        # Tokens without a JTI can't be blacklisted
+        return bool(jti) and TokenBlacklist.is_jti_blacklisted(jti)
+    
+    @staticmethod
+    def is_jti_blacklisted(jti):
+        """
+        Check if a token ID is blacklisted
+        
+        Args:
+            jti (str): JWT ID from an already decoded token
+            
+        Returns:
+            bool: True if blacklisted, False otherwise
+        """
+        jtis = _blacklist_mirror['jtis']
+        if jtis is None:
+            jtis = TokenBlacklist.refresh_cache()
+        return jti in jtis
+    
+    @staticmethod
+    def refresh_cache():
+        """
+        Resync the in-memory JTI set from the database
+        
+        Returns:
+            set: Blacklisted JTIs
+        """
+        with _blacklist_mirror_lock:
+            jtis = _auth_db.keys('blacklist')
+            _blacklist_mirror['jtis'] = jtis
+        return jtis
     
     @staticmethod
     def cleanup_expired_entries():
@@ -603,21 +1155,7 @@ class TokenBlacklist:
         Returns:
             int: Number of entries removed
         """
-        blacklist = TokenBlacklist.load_blacklist()
-        now = datetime.utcnow()
-        
-        expired_entries = {
-            jti: entry
-            for jti, entry in blacklist.items()
-            if datetime.fromisoformat(entry['expires_at']) < now
-        }
-        
-        # Remove expired entries
-        for jti in expired_entries:
-            del blacklist[jti]
-        
-        TokenBlacklist.save_blacklist(blacklist)
-        return len(expired_entries)
+        return _auth_db.delete_expired('blacklist', int(time.time()))
 
 
 class AuthLogger:
@@ -625,26 +1163,49 @@ class AuthLogger:
     
     @staticmethod
     def load_logs():
-        """Load auth logs from file"""
-        if not AUTH_LOG_FILE.exists():
-            return []
-        
-        try:
-            with open(AUTH_LOG_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"Error loading auth logs: {str(e)}")
-            return []
+        """Load auth logs, including entries not yet flushed"""
+        return list(AuthLogger._entries())
     
     @staticmethod
     def save_logs(logs):
-        """Save auth logs to file"""
-        try:
-            with open(AUTH_LOG_FILE, 'w') as f:
-                json.dump(logs, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving auth logs: {str(e)}")
-            raise
+        """Replace the auth logs and write them immediately"""
+        with _auth_log_lock:
+            _auth_log['entries'] = deque(logs, maxlen=AUTH_LOG_MAX_ENTRIES)
+        AuthLogger.flush()
+    
+    @staticmethod
+    def flush():
+        """
+        Write the in-memory log buffer to file
+        
+        The buffer is only locked long enough to copy it; serialization and
+        the file write happen outside the lock so log_event never waits on disk.
+        """
+        with _auth_log_write_lock:
+            with _auth_log_lock:
+                _auth_log['flush_timer'] = None
+                if _auth_log['entries'] is None:
+                    return
+                snapshot = list(_auth_log['entries'])
+            
+            try:
+                _atomic_write(AUTH_LOG_FILE, orjson.dumps(snapshot), fsync=False)
+            except Exception as e:
+                logger.error(f"Error saving auth logs: {str(e)}")
+    
+    @staticmethod
+    def _entries():
+        """Return the log ring buffer, reading the file on first use"""
+        with _auth_log_lock:
+            if _auth_log['entries'] is None:
+                logs = []
+                if AUTH_LOG_FILE.exists():
+                    try:
+                        logs = orjson.loads(AUTH_LOG_FILE.read_bytes())
+                    except (orjson.JSONDecodeError, FileNotFoundError) as e:
+                        logger.error(f"Error loading auth logs: {str(e)}")
+                _auth_log['entries'] = deque(logs, maxlen=AUTH_LOG_MAX_ENTRIES)
+            return _auth_log['entries']
     
     @staticmethod
     def log_event(event_type, user_id=None, username=None, success=True, details=None, ip_address=None, user_agent=None):
@@ -663,8 +1224,6 @@ class AuthLogger:
         Returns:
             bool: Success or failure
         """
-        logs = AuthLogger.load_logs()
-        
         # Create log entry
         log_entry = {
             'event_id': str(uuid.uuid4()),
@@ -678,14 +1237,15 @@ class AuthLogger:
             'user_agent': user_agent
         }
         
-        # Add to logs
-        logs.append(log_entry)
-        
-        # Limit log size (keep last 1000 entries)
-        if len(logs) > 1000:
-            logs = logs[-1000:]
-        
-        AuthLogger.save_logs(logs)
+        # Add to logs; the deque drops the oldest entry beyond AUTH_LOG_MAX_ENTRIES
+        with _auth_log_lock:
+            AuthLogger._entries().append(log_entry)
+            
+            if _auth_log['flush_timer'] is None:
+                timer = threading.Timer(WRITE_COALESCE_SECONDS, AuthLogger.flush)
+                timer.daemon = True
+                timer.start()
+                _auth_log['flush_timer'] = timer
         return True
     
     @staticmethod
@@ -700,13 +1260,22 @@ class AuthLogger:
         Returns:
             list: Log entries
         """
-        logs = AuthLogger.load_logs()
-        
-        # Filter logs for this user
-        user_logs = [log for log in logs if log['user_id'] == user_id]
+        user_logs = []
+        if limit <= 0:
+            return user_logs
         
-        # Sort by timestamp (newest first)
-        user_logs.sort(key=lambda log: log['timestamp'], reverse=True)
+        with _auth_log_lock:
+            # Entries are appended in time order, so walking backwards yields
+            # newest first and can stop as soon as the limit is reached
+            for log in reversed(AuthLogger._entries()):
+                if log['user_id'] == user_id:
+                    user_logs.append(log)
+                    if len(user_logs) >= limit:
+                        break
         
-        # Limit number of logs
-        return user_logs[:limit] 
\ No newline at end of file
+        return user_logs
+
+
+# Flush buffered auth events and session activity on shutdown
+atexit.register(AuthLogger.flush)
+atexit.register(SessionManager.flush_session_activity)
@@ -8,11 +8,16 @@ import uuid
 from datetime import datetime, timedelta
 import os
 import hashlib
+import hmac
+import threading
+from collections import deque
 from functools import wraps
-import jwt
+from time import monotonic
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from flask import Blueprint, request, jsonify, make_response, g, abort
 
-from .models import User, Guest, UserDatabase, TokenBlacklist, SessionManager, AuthLogger
+from .models import User, Guest, UserDatabase, TokenBlacklist, SessionManager, AuthLogger, expiry_to_iso, unverified_claims
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -23,10 +28,33 @@ auth_routes = Blueprint('auth', __name__)
 # JWT Secret key
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-here')
 
+# Environment-derived settings, read once at import
+COOKIE_SECURE = os.environ.get('FLASK_ENV') == 'production'  # Secure cookies in production
+ADMIN_SECRET = os.environ.get('ADMIN_SECRET', 'admin-secret-token')
+_ADMIN_SECRET_BYTES = ADMIN_SECRET.encode()
+
+# Attributes shared by every auth_token cookie we issue
+_AUTH_COOKIE_KWARGS = {'httponly': True, 'secure': COOKIE_SECURE, 'samesite': 'Lax'}
+
 # Rate limiting configuration
 RATE_LIMIT_WINDOW = 60  # 1 minute
 RATE_LIMIT_MAX_REQUESTS = 10  # 10 requests per minute
-rate_limit_cache = {}  # ip -> [(timestamp, endpoint), ...]
+RATE_LIMIT_BUCKET_SECONDS = 10  # Width of each sliding-window bucket
+RATE_LIMIT_BUCKETS = RATE_LIMIT_WINDOW // RATE_LIMIT_BUCKET_SECONDS
+RATE_LIMIT_SWEEP_INTERVAL = 300  # Drop idle keys every 5 minutes
+rate_limit_cache = {}  # (ip, endpoint) -> {'bucket': int, 'counts': deque}
+rate_limit_blocked = {}  # (ip, endpoint) -> monotonic time the block lifts
+_rate_limit_sweep = {'next': 0}
+_rate_limit_lock = threading.Lock()  # Guards the counters under threaded servers
+
+# Input size limits, checked before any hashing or logging
+MAX_PASSWORD_LENGTH = 128
+MAX_USERNAME_LENGTH = 64
+MAX_EMAIL_LENGTH = 254
+MAX_DISPLAY_NAME_LENGTH = 64
+
+# Argon2id with the RFC 9106 / OWASP low-memory parameters (19 MiB, 2 passes)
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
 
 def require_json():
     """Decorator to require JSON content type"""
@@ -39,35 +67,95 @@ def require_json():
         return decorated_function
     return decorator
 
+def _sweep_rate_limit_cache(now_bucket):
+    """
+    Drop keys whose whole window has expired (all buckets would be zero)
+    
+    Must be called with _rate_limit_lock held.
+    """
+    stale = [
+        key for key, entry in rate_limit_cache.items()
+        if now_bucket - entry['bucket'] >= RATE_LIMIT_BUCKETS
+    ]
+    for key in stale:
+        rate_limit_cache.pop(key, None)
+    
+    now = now_bucket * RATE_LIMIT_BUCKET_SECONDS
+    expired = [key for key, until in rate_limit_blocked.items() if until <= now]
+    for key in expired:
+        rate_limit_blocked.pop(key, None)
+
+def _rate_limit_counts(key, now_bucket):
+    """
+    Get the bucket counters for a key, advanced to the current bucket
+    
+    Must be called with _rate_limit_lock held.
+    
+    Args:
+        key (tuple): (client_ip, endpoint)
+        now_bucket (int): Index of the current time bucket
+    
+    Returns:
+        deque: Per-bucket request counts, oldest first
+    """
+    entry = rate_limit_cache.get(key)
+    if entry is None:
+        entry = rate_limit_cache[key] = {
+            'bucket': now_bucket,
+            'counts': deque([0] * RATE_LIMIT_BUCKETS, maxlen=RATE_LIMIT_BUCKETS)
+        }
+        return entry['counts']
+    
+    counts = entry['counts']
+    elapsed = now_bucket - entry['bucket']
+    if elapsed > 0:
+        # The deque is bounded, so appending pushes the oldest buckets out
+        counts.extend([0] * min(elapsed, RATE_LIMIT_BUCKETS))
+        entry['bucket'] = now_bucket
+    return counts
+
 def rate_limit():
     """Decorator to implement rate limiting on endpoints"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            client_ip = request.remote_addr
-            current_time = datetime.utcnow().timestamp()
-            endpoint = request.path
+            current_time = monotonic()
+            key = (request.remote_addr, request.path)
+            
+            # Fast path: clients already over the limit are rejected with a
+            # lock-free read, without touching the counters
+            blocked_until = rate_limit_blocked.get(key)
+            if blocked_until is not None and current_time < blocked_until:
+                return jsonify({
+                    'error': 'Rate limit exceeded',
+                    'retry_after': int(blocked_until - current_time) + 1
+                }), 429
             
-            # Initialize rate limit tracking for this IP if not exists
-            if client_ip not in rate_limit_cache:
-                rate_limit_cache[client_ip] = []
+            now_bucket = int(current_time // RATE_LIMIT_BUCKET_SECONDS)
             
-            # Remove entries older than the window
-            rate_limit_cache[client_ip] = [
-                entry for entry in rate_limit_cache[client_ip]
-                if current_time - entry[0] < RATE_LIMIT_WINDOW and entry[1] == endpoint
-            ]
+            with _rate_limit_lock:
+                if blocked_until is not None:
+                    rate_limit_blocked.pop(key, None)
+                
+                if current_time >= _rate_limit_sweep['next']:
+                    _rate_limit_sweep['next'] = current_time + RATE_LIMIT_SWEEP_INTERVAL
+                    _sweep_rate_limit_cache(now_bucket)
+                
+                counts = _rate_limit_counts(key, now_bucket)
+                
+                # Check if limit exceeded
+                exceeded = sum(counts) >= RATE_LIMIT_MAX_REQUESTS
+                if exceeded:
+                    rate_limit_blocked[key] = current_time + RATE_LIMIT_WINDOW
+                else:
+                    counts[-1] += 1
             
-            # Check if limit exceeded
-            if len(rate_limit_cache[client_ip]) >= RATE_LIMIT_MAX_REQUESTS:
+            if exceeded:
                 return jsonify({
                     'error': 'Rate limit exceeded',
                     'retry_after': RATE_LIMIT_WINDOW
                 }), 429
             
-            # Add current request to cache
-            rate_limit_cache[client_ip].append((current_time, endpoint))
-            
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -103,33 +191,64 @@ def require_auth():
         return decorated_function
     return decorator
 
+def _too_long(value, limit):
+    """Check if a request field is longer than its limit"""
+    return isinstance(value, str) and len(value) > limit
+
 def hash_password(password):
-    """Hash a password using SHA-256"""
-    # In production, use a secure password hashing library like bcrypt
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash a password using Argon2id (salted PHC string)"""
+    return _password_hasher.hash(password)
+
+def _is_legacy_hash(password_hash):
+    """Check for an unsalted SHA-256 hash from before the Argon2 migration"""
+    return not password_hash.startswith('$argon2')
 
 def check_password(password_hash, password):
     """Check a password against its hash"""
-    return password_hash == hash_password(password)
+    if _is_legacy_hash(password_hash):
+        # Constant-time compare so the digest can't be recovered byte by byte
+        return hmac.compare_digest(password_hash, hashlib.sha256(password.encode()).hexdigest())
+    
+    try:
+        return _password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def password_needs_rehash(password_hash):
+    """Check if a stored hash should be upgraded after a successful login"""
+    return _is_legacy_hash(password_hash) or _password_hasher.check_needs_rehash(password_hash)
 
 def _get_token_from_request():
     """Get token from request (cookie or header)"""
     token = request.cookies.get('auth_token')
     
-    if not token and 'Authorization' in request.headers:
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Bearer '):
-            token = auth_header[7:]  # Remove 'Bearer ' prefix
+    if not token:
+        auth_header = request.headers.get('Authorization')
+        if auth_header:
+            bearer_token = auth_header.removeprefix('Bearer ')
+            if len(bearer_token) < len(auth_header):  # Only accept the Bearer scheme
+                token = bearer_token
     
     return token
 
-def _get_device_info():
-    """Get device information from request"""
-    user_agent = request.headers.get('User-Agent', 'Unknown')
+def _set_auth_cookie(response, token, exp_time):
+    """Set the auth_token cookie on a response"""
+    response.set_cookie('auth_token', token, expires=exp_time, **_AUTH_COOKIE_KWARGS)
+
+def _get_device_info(ip_address, user_agent):
+    """
+    Get device information from request
+    
+    Args:
+        ip_address (str): Client address already read by the handler
+        user_agent (str): User-Agent header already read by the handler
     
+    Returns:
+        dict: Device information for the session
+    """
     return {
-        'user_agent': user_agent,
-        'ip_address': request.remote_addr,
+        'user_agent': user_agent or 'Unknown',
+        'ip_address': ip_address,
         'origin': request.headers.get('Origin'),
         'referer': request.headers.get('Referer')
     }
@@ -139,6 +258,8 @@ def _get_device_info():
 @rate_limit()
 def login():
     """Handle user login"""
+    ip_address = request.remote_addr
+    user_agent = request.headers.get('User-Agent')
     data = request.get_json()
     
     if not data:
@@ -148,20 +269,21 @@ def login():
     password = data.get('password', '')
     remember = data.get('remember', False)
     
+    if _too_long(username, MAX_EMAIL_LENGTH) or _too_long(password, MAX_PASSWORD_LENGTH):
+        return jsonify({'error': 'Username or password too long'}), 400
+    
     # Log login attempt (without sensitive data)
     AuthLogger.log_event(
         event_type='login_attempt',
         username=username,
         success=False,  # Set to False initially
-        ip_address=request.remote_addr,
-        user_agent=request.headers.get('User-Agent'),
+        ip_address=ip_address,
+        user_agent=user_agent,
         details={'remember': remember}
     )
     
     # Find user by username or email
-    user = User.get_by_username(username)
-    if not user and '@' in username:
-        user = User.get_by_email(username)
+    user = User.get_by_identifier(username)
     
     if user and check_password(user.password_hash, password):
         # Check if user is active
@@ -171,17 +293,22 @@ def login():
                 user_id=user.user_id,
                 username=username,
                 success=False,
-                ip_address=request.remote_addr,
-                user_agent=request.headers.get('User-Agent'),
+                ip_address=ip_address,
+                user_agent=user_agent,
                 details={'reason': f'User status: {user.status}'}
             )
             return jsonify({'error': 'Account is not active'}), 403
         
+        # Upgrade legacy or outdated password hashes now that we have the password
+        if password_needs_rehash(user.password_hash):
+            user.password_hash = hash_password(password)
+            user.save()
+        
         # Set token expiration based on "remember me" option
         expiration = 30 * 86400 if remember else 86400  # 30 days or 1 day
         
         # Get device info
-        device_info = _get_device_info()
+        device_info = _get_device_info(ip_address, user_agent)
         
         # Generate token
         token, exp_time = user.generate_auth_token(expiration, device_info)
@@ -197,14 +324,7 @@ def login():
         response = make_response(jsonify(response_data))
         
         # Set token cookie
-        response.set_cookie(
-            'auth_token', 
-            token,
-            httponly=True,
-            secure=os.environ.get('FLASK_ENV') == 'production',  # True in production
-            samesite='Lax',
-            expires=exp_time
-        )
+        _set_auth_cookie(response, token, exp_time)
         
         # Log successful login
         AuthLogger.log_event(
@@ -212,8 +332,8 @@ def login():
             user_id=user.user_id,
             username=username,
             success=True,
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent'),
+            ip_address=ip_address,
+            user_agent=user_agent,
             details={'remember': remember}
         )
         
@@ -226,8 +346,8 @@ def login():
         event_type='login_failure',
         username=username,
         success=False,
-        ip_address=request.remote_addr,
-        user_agent=request.headers.get('User-Agent'),
+        ip_address=ip_address,
+        user_agent=user_agent,
         details={'reason': 'Invalid credentials'}
     )
     
@@ -240,6 +360,8 @@ def login():
 @rate_limit()
 def register():
     """Handle user registration"""
+    ip_address = request.remote_addr
+    user_agent = request.headers.get('User-Agent')
     data = request.get_json()
     
     if not data:
@@ -250,13 +372,25 @@ def register():
     password = data.get('password', '')
     display_name = data.get('display_name', username.capitalize() if username else '')
     
+    if _too_long(username, MAX_USERNAME_LENGTH):
+        return jsonify({'error': f'Username must be at most {MAX_USERNAME_LENGTH} characters long'}), 400
+    
+    if _too_long(email, MAX_EMAIL_LENGTH):
+        return jsonify({'error': f'Email must be at most {MAX_EMAIL_LENGTH} characters long'}), 400
+    
+    if _too_long(password, MAX_PASSWORD_LENGTH):
+        return jsonify({'error': f'Password must be at most {MAX_PASSWORD_LENGTH} characters long'}), 400
+    
+    if _too_long(display_name, MAX_DISPLAY_NAME_LENGTH):
+        return jsonify({'error': f'Display name must be at most {MAX_DISPLAY_NAME_LENGTH} characters long'}), 400
+    
     # Log registration attempt
     AuthLogger.log_event(
         event_type='register_attempt',
         username=username,
         success=False,  # Set to False initially
-        ip_address=request.remote_addr,
-        user_agent=request.headers.get('User-Agent'),
+        ip_address=ip_address,
+        user_agent=user_agent,
         details={'email': email}
     )
     
@@ -273,8 +407,8 @@ def register():
             event_type='register_failure',
             username=username,
             success=False,
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent'),
+            ip_address=ip_address,
+            user_agent=user_agent,
             details={'reason': 'Username already exists'}
         )
         return jsonify({'error': 'Username already exists'}), 409
@@ -284,8 +418,8 @@ def register():
             event_type='register_failure',
             username=username,
             success=False,
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent'),
+            ip_address=ip_address,
+            user_agent=user_agent,
             details={'reason': 'Email already exists', 'email': email}
         )
         return jsonify({'error': 'Email already exists'}), 409
@@ -296,7 +430,7 @@ def register():
     user.save()
     
     # Get device info
-    device_info = _get_device_info()
+    device_info = _get_device_info(ip_address, user_agent)
     
     # Generate token (default 30 days for new registrations)
     token, exp_time = user.generate_auth_token(30 * 86400, device_info)
@@ -312,14 +446,7 @@ def register():
     response = make_response(jsonify(response_data))
     
     # Set token cookie
-    response.set_cookie(
-        'auth_token', 
-        token,
-        httponly=True,
-        secure=os.environ.get('FLASK_ENV') == 'production',  # True in production
-        samesite='Lax',
-        expires=exp_time
-    )
+    _set_auth_cookie(response, token, exp_time)
     
     # Log successful registration
     AuthLogger.log_event(
@@ -327,8 +454,8 @@ def register():
         user_id=user.user_id,
         username=username,
         success=True,
-        ip_address=request.remote_addr,
-        user_agent=request.headers.get('User-Agent'),
+        ip_address=ip_address,
+        user_agent=user_agent,
         details={'email': email}
     )
     
@@ -339,10 +466,12 @@ def register():
 @auth_routes.route('/guest', methods=['POST'])
 def guest_login():
     """Handle guest login"""
+    ip_address = request.remote_addr
+    user_agent = request.headers.get('User-Agent')
     guest = Guest()
     
     # Get device info
-    device_info = _get_device_info()
+    device_info = _get_device_info(ip_address, user_agent)
     
     # Generate token (1 day for guests)
     token, exp_time = guest.generate_auth_token(86400, device_info)
@@ -352,8 +481,8 @@ def guest_login():
         event_type='guest_login',
         user_id=f"guest:{guest.visitor_id}",
         success=True,
-        ip_address=request.remote_addr,
-        user_agent=request.headers.get('User-Agent'),
+        ip_address=ip_address,
+        user_agent=user_agent,
         details={'visitor_id': guest.visitor_id}
     )
     
@@ -368,43 +497,42 @@ def guest_login():
     response = make_response(jsonify(response_data))
     
     # Set token cookie
-    response.set_cookie(
-        'auth_token', 
-        token,
-        httponly=True,
-        secure=os.environ.get('FLASK_ENV') == 'production',  # True in production
-        samesite='Lax',
-        expires=exp_time
-    )
+    _set_auth_cookie(response, token, exp_time)
     
     return response
 
 @auth_routes.route('/logout', methods=['POST'])
 def logout():
     """Handle user logout"""
+    ip_address = request.remote_addr
+    user_agent = request.headers.get('User-Agent')
     token = _get_token_from_request()
     
     if token:
         try:
-            # Parse token without verification
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'], options={"verify_signature": False})
-            user_id = payload.get('user_id')
-            session_id = payload.get('jti')
-            
-            # Blacklist token
-            TokenBlacklist.blacklist_token(token, reason="logout")
+            # Only a token that verifies can blacklist itself and end its session
+            payload = User.verify_auth_token(token)
             
-            # Remove session
-            if session_id:
-                SessionManager.remove_session(session_id)
+            if payload:
+                user_id = payload.get('user_id')
+                
+                # Blacklist token (this also removes its session)
+                TokenBlacklist.blacklist_token(token, reason="logout", claims=payload)
+                details = None
+            else:
+                # Expired, revoked or forged: there is nothing left to revoke, and
+                # unverified claims must not pick a session, so they're only logged
+                user_id = unverified_claims(token).get('user_id')
+                details = {'token_verified': False}
             
             # Log logout
             AuthLogger.log_event(
                 event_type='logout',
                 user_id=user_id,
                 success=True,
-                ip_address=request.remote_addr,
-                user_agent=request.headers.get('User-Agent')
+                details=details,
+                ip_address=ip_address,
+                user_agent=user_agent
             )
             
         except Exception as e:
@@ -421,6 +549,8 @@ def logout():
 @auth_routes.route('/refresh', methods=['POST'])
 def refresh_token():
     """Refresh authentication token"""
+    ip_address = request.remote_addr
+    user_agent = request.headers.get('User-Agent')
     token = _get_token_from_request()
     
     if not token:
@@ -433,7 +563,7 @@ def refresh_token():
             return jsonify({'error': 'Invalid or expired token'}), 401
         
         # Get device info
-        device_info = _get_device_info()
+        device_info = _get_device_info(ip_address, user_agent)
         
         # Check if it's a guest token
         if 'is_guest' in payload and payload['is_guest']:
@@ -451,8 +581,8 @@ def refresh_token():
                 event_type='token_refresh',
                 user_id=f"guest:{guest.visitor_id}",
                 success=True,
-                ip_address=request.remote_addr,
-                user_agent=request.headers.get('User-Agent'),
+                ip_address=ip_address,
+                user_agent=user_agent,
                 details={'is_guest': True}
             )
         else:
@@ -476,25 +606,18 @@ def refresh_token():
                 user_id=user.user_id,
                 username=user.username,
                 success=True,
-                ip_address=request.remote_addr,
-                user_agent=request.headers.get('User-Agent')
+                ip_address=ip_address,
+                user_agent=user_agent
             )
         
         # Create response object
         response = make_response(jsonify(response_data))
         
         # Set new token cookie
-        response.set_cookie(
-            'auth_token', 
-            new_token,
-            httponly=True,
-            secure=os.environ.get('FLASK_ENV') == 'production',  # True in production
-            samesite='Lax',
-            expires=exp_time
-        )
+        _set_auth_cookie(response, new_token, exp_time)
         
         # Blacklist old token
-        TokenBlacklist.blacklist_token(token, reason="refresh")
+        TokenBlacklist.blacklist_token(token, reason="refresh", claims=payload)
         
         return response
         
@@ -533,8 +656,8 @@ def verify():
         else:
             # Regular user token
             user_id = payload.get('user_id')
-            user = User.get_by_id(user_id)
-            if not user:
+            user_dict = User.get_dict_by_id(user_id)
+            if not user_dict:
                 return jsonify({
                     'authenticated': False,
                     'token_status': 'invalid',
@@ -544,7 +667,7 @@ def verify():
             return jsonify({
                 'authenticated': True,
                 'token_status': 'valid',
-                'user': user.to_dict()
+                'user': user_dict
             }), 200
             
     except Exception as e:
@@ -581,9 +704,9 @@ def check_session():
                     result['visitor_id'] = payload.get('visitor_id')
                 else:
                     user_id = payload.get('user_id')
-                    user = User.get_by_id(user_id)
-                    if user:
-                        result['user'] = user.to_dict()
+                    user_dict = User.get_dict_by_id(user_id)
+                    if user_dict:
+                        result['user'] = user_dict
                 
                 # Add session info
                 session_id = payload.get('jti')
@@ -620,6 +743,9 @@ def set_user_name():
     if not display_name or len(display_name) < 1:
         return jsonify({'error': 'Display name cannot be empty'}), 400
     
+    if _too_long(display_name, MAX_DISPLAY_NAME_LENGTH):
+        return jsonify({'error': f'Display name must be at most {MAX_DISPLAY_NAME_LENGTH} characters long'}), 400
+    
     # Update user
     user = User.get_by_id(g.user_id)
     if not user:
@@ -651,14 +777,13 @@ def get_user_sessions():
     if g.is_guest:
         return jsonify({'error': 'Guest users cannot view sessions'}), 403
     
-    sessions = SessionManager.load_sessions()
+    sessions = SessionManager.get_user_sessions(g.user_id)
     
-    # Filter sessions for this user
-    user_sessions = {
-        session_id: {
+    user_sessions = [
+        {
             'session_id': session_id,
             'created_at': session['created_at'],
-            'expires_at': session['expires_at'],
+            'expires_at': expiry_to_iso(session['expires_at']),
             'last_activity': session['last_activity'],
             'device_info': {
                 'user_agent': session['device_info'].get('user_agent'),
@@ -667,12 +792,11 @@ def get_user_sessions():
             'current': session_id == g.jti
         }
         for session_id, session in sessions.items()
-        if session['user_id'] == g.user_id
-    }
+    ]
     
     return jsonify({
         'success': True,
-        'sessions': list(user_sessions.values())
+        'sessions': user_sessions
     }), 200
 
 @auth_routes.route('/sessions/<session_id>', methods=['DELETE'])
@@ -720,19 +844,8 @@ def terminate_all_sessions():
     if g.is_guest:
         return jsonify({'error': 'Guest users cannot terminate sessions'}), 403
     
-    # Get all sessions
-    sessions = SessionManager.load_sessions()
-    
-    # Filter sessions for this user
-    user_sessions = {
-        session_id: session
-        for session_id, session in sessions.items()
-        if session['user_id'] == g.user_id and session_id != g.jti
-    }
-    
-    # Remove each session
-    for session_id in user_sessions:
-        SessionManager.remove_session(session_id)
+    # Remove the user's other sessions in one indexed delete
+    count = SessionManager.remove_user_sessions(g.user_id, except_session_id=g.jti)
     
     # Log termination
     AuthLogger.log_event(
@@ -742,12 +855,12 @@ def terminate_all_sessions():
         success=True,
         ip_address=request.remote_addr,
         user_agent=request.headers.get('User-Agent'),
-        details={'count': len(user_sessions)}
+        details={'count': count}
     )
     
     return jsonify({
         'success': True,
-        'count': len(user_sessions)
+        'count': count
     }), 200
 
 @auth_routes.route('/maintenance/cleanup', methods=['POST'])
@@ -757,7 +870,8 @@ def cleanup_expired_data():
     # For simplicity, we're using a secret token in the request
     secret = request.headers.get('X-Admin-Secret')
     
-    if not secret or secret != os.environ.get('ADMIN_SECRET', 'admin-secret-token'):
+    # Constant-time compare so the secret can't be guessed byte by byte
+    if not secret or not hmac.compare_digest(secret.encode(), _ADMIN_SECRET_BYTES):
         abort(404)  # Return 404 to avoid disclosing the endpoint exists
     
     # Cleanup expired sessions
@@ -0,0 +1,210 @@
+"""
+Auth Service - Store
+SQLite-backed key/value storage for sessions and blacklisted tokens
+"""
+
+import sqlite3
+import threading
+
+import orjson
+
+# Tables managed by the store; names are interpolated into SQL so they are fixed
+TABLES = ('sessions', 'blacklist')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    key TEXT PRIMARY KEY,
+    user_id TEXT,
+    expires_at INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
+
+CREATE TABLE IF NOT EXISTS blacklist (
+    key TEXT PRIMARY KEY,
+    user_id TEXT,
+    expires_at INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blacklist_expires_at ON blacklist(expires_at);
+"""
+
+
+class SQLiteStore:
+    """
+    Key/value store over SQLite in WAL mode
+    
+    Each row keeps the record as JSON alongside the columns that are queried
+    directly (user_id, expires_at), so per-user and expiry deletes run as a
+    single indexed statement. Connections are opened per thread.
+    """
+    
+    def __init__(self, db_path):
+        """
+        Initialize the store and create the schema
+        
+        Args:
+            db_path (Path): SQLite database file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+    
+    def _conn(self):
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def _check_table(table):
+        """Reject table names outside TABLES"""
+        if table not in TABLES:
+            raise ValueError(f"Unknown table: {table}")
+    
+    def get(self, table, key):
+        """
+        Get a record
+        
+        Args:
+            table (str): Table name
+            key (str): Record key
+        
+        Returns:
+            dict: Record or None if not found
+        """
+        self._check_table(table)
+        row = self._conn().execute(f'SELECT data FROM {table} WHERE key = ?', (key,)).fetchone()
+        return orjson.loads(row[0]) if row else None
+    
+    def contains(self, table, key):
+        """Check whether a record exists"""
+        self._check_table(table)
+        return self._conn().execute(f'SELECT 1 FROM {table} WHERE key = ?', (key,)).fetchone() is not None
+    
+    def put(self, table, key, record, expires_at, user_id=None):
+        """
+        Insert or replace a record
+        
+        Args:
+            table (str): Table name
+            key (str): Record key
+            record (dict): Record data
+            expires_at (int): Expiry as a Unix timestamp
+            user_id (str): Owning user, for per-user queries
+        """
+        self._check_table(table)
+        self._conn().execute(
+            f'INSERT OR REPLACE INTO {table} (key, user_id, expires_at, data) VALUES (?, ?, ?, ?)',
+            (key, user_id, expires_at, orjson.dumps(record))
+        )
+    
+    def delete(self, table, key):
+        """
+        Delete a record
+        
+        Returns:
+            bool: True if a record was deleted
+        """
+        self._check_table(table)
+        return self._conn().execute(f'DELETE FROM {table} WHERE key = ?', (key,)).rowcount > 0
+    
+    def delete_user(self, table, user_id, keep_key=None):
+        """
+        Delete all records owned by a user
+        
+        Args:
+            table (str): Table name
+            user_id (str): Owning user
+            keep_key (str): Record key to leave in place, if any
+        
+        Returns:
+            int: Number of records deleted
+        """
+        self._check_table(table)
+        if keep_key is None:
+            return self._conn().execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,)).rowcount
+        return self._conn().execute(
+            f'DELETE FROM {table} WHERE user_id = ? AND key != ?', (user_id, keep_key)
+        ).rowcount
+    
+    def delete_expired(self, table, now):
+        """
+        Delete all records that expired before now
+        
+        Args:
+            table (str): Table name
+            now (int): Current Unix timestamp
+        
+        Returns:
+            int: Number of records deleted
+        """
+        self._check_table(table)
+        return self._conn().execute(f'DELETE FROM {table} WHERE expires_at < ?', (now,)).rowcount
+    
+    def find_by_user(self, table, user_id):
+        """
+        Get all records owned by a user via the user_id index
+        
+        Returns:
+            dict: Records keyed by record key
+        """
+        self._check_table(table)
+        rows = self._conn().execute(f'SELECT key, data FROM {table} WHERE user_id = ?', (user_id,))
+        return {key: orjson.loads(data) for key, data in rows}
+    
+    def all(self, table):
+        """
+        Get every record in a table
+        
+        Returns:
+            dict: Records keyed by record key
+        """
+        self._check_table(table)
+        rows = self._conn().execute(f'SELECT key, data FROM {table}')
+        return {key: orjson.loads(data) for key, data in rows}
+    
+    def keys(self, table):
+        """
+        Get every record key in a table
+        
+        Returns:
+            set: Record keys
+        """
+        self._check_table(table)
+        return {key for (key,) in self._conn().execute(f'SELECT key FROM {table}')}
+    
+    def count(self, table):
+        """Count the records in a table"""
+        self._check_table(table)
+        return self._conn().execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    
+    def replace_all(self, table, rows):
+        """
+        Replace the contents of a table in one transaction
+        
+        Args:
+            table (str): Table name
+            rows (iterable): (key, record, expires_at, user_id) tuples
+        """
+        self._check_table(table)
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(f'DELETE FROM {table}')
+            conn.executemany(
+                f'INSERT OR REPLACE INTO {table} (key, user_id, expires_at, data) VALUES (?, ?, ?, ?)',
+                (
+                    (key, user_id, expires_at, orjson.dumps(record))
+                    for key, record, expires_at, user_id in rows
+                )
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
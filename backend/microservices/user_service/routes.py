@@ -5,12 +5,14 @@ Defines API routes for the user service
 
 import logging
 import json
-import requests
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
-from functools import wraps
+import jwt
+import orjson
+from flask import Blueprint, request, jsonify, current_app, send_from_directory, g
+from werkzeug.exceptions import HTTPException
 import os
-import time
+import secrets
 import base64
+from concurrent.futures import ThreadPoolExecutor
 
 from .models import UserProfile, UserSettings
 
@@ -20,13 +22,51 @@ logger = logging.getLogger(__name__)
 # Create Blueprint
 user_routes = Blueprint('user_routes', __name__)
 
-# AUTH SERVICE URL
-AUTH_SERVICE_URL = "http://localhost:5501"  # Should be configurable
+# JWT Secret key, shared with the Auth Service that issues the tokens
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-here')
 
-def token_required(f):
-    """Decorator to require valid JWT token for access"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
+# Avatar storage, created once at import
+UPLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'avatars')
+os.makedirs(UPLOADS_DIR, exist_ok=True)
+
+# Avatar upload limits
+ALLOWED_AVATAR_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif'})
+MAX_AVATAR_BYTES = 5 * 1024 * 1024  # 5 MB decoded
+AVATAR_CACHE_MAX_AGE = 86400  # Avatar filenames are never reused, so clients can keep them a day
+BASE64_CHUNK_CHARS = 64 * 1024  # Must be a multiple of 4 so chunks decode independently
+
+# Saves the new avatar URL to the profile after the upload response is sent
+_avatar_save_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='avatar-save')
+
+# Batch requests: operations per call, and views that can't run inside a batch
+BATCH_MAX_OPERATIONS = 20
+_BATCH_EXCLUDED_ENDPOINTS = frozenset({'batch', 'get_avatar'})
+
+# Views reachable without a token, and views restricted to admins
+_PUBLIC_ENDPOINTS = frozenset({'get_avatar'})
+_ADMIN_ENDPOINTS = frozenset({
+    'admin_update_profile',
+    'delete_profile',
+    'admin_get_settings',
+    'admin_update_settings'
+})
+
+@user_routes.before_request
+def authenticate_request():
+    """Verify the caller once per request and enforce admin-only views"""
+    endpoint = request.endpoint.rsplit('.', 1)[-1] if request.endpoint else None
+    if request.method == 'OPTIONS' or endpoint in _PUBLIC_ENDPOINTS:
+        return None
+    
+    # Reuse the user the auth middleware already verified for this request
+    user = g.get('user')
+    if user and user.get('is_authenticated') and user.get('user_id'):
+        request.user = {
+            'user_id': user['user_id'],
+            'username': user.get('username'),
+            'role': user.get('role')
+        }
+    else:
         token = None
         auth_header = request.headers.get('Authorization')
         
@@ -38,49 +78,132 @@ def token_required(f):
         if not token:
             return jsonify({'message': 'Authentication token is missing'}), 401
         
+        # Verify the token locally instead of calling the Auth Service per request
         try:
-            # Verify token with Auth Service
-            response = requests.get(
-                f"{AUTH_SERVICE_URL}/api/auth/verify-token",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            
-            if response.status_code != 200:
-                return jsonify({'message': 'Invalid or expired token'}), 401
-            
-            # Get user data from response
-            auth_response = response.json()
-            user_data = auth_response.get('user', {})
-            
-            # Create a properly formatted user object with consistent field names
-            # Map 'id' to 'user_id' for compatibility
-            request.user = {
-                'user_id': user_data.get('id'),
-                'username': user_data.get('username'),
-                'role': user_data.get('role')
-            }
-            
-            return f(*args, **kwargs)
+            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return jsonify({'message': 'Token has expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'message': 'Invalid or expired token'}), 401
+        
+        request.user = {
+            'user_id': payload.get('user_id'),
+            'username': payload.get('username'),
+            'role': payload.get('role')
+        }
+    
+    g.is_admin = request.user.get('role') == 'admin'
+    if endpoint in _ADMIN_ENDPOINTS and not g.is_admin:
+        return jsonify({'message': 'Admin privileges required'}), 403
+    
+    return None
+
+def _write_base64_file(path, data):
+    """
+    Decode base64 text to a file a chunk at a time
+    
+    Avoids holding the decoded image in memory alongside the encoded text.
+    The partial file is removed if decoding fails.
+    
+    Args:
+        path (str): Destination file path
+        data (str): Base64-encoded content
+    """
+    try:
+        with open(path, 'wb') as f:
+            for start in range(0, len(data), BASE64_CHUNK_CHARS):
+                f.write(base64.b64decode(data[start:start + BASE64_CHUNK_CHARS], validate=True))
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+def _persist_avatar_url(app, user_id, avatar_url):
+    """
+    Save a new avatar URL to a user's profile
+    
+    Runs on the avatar save executor, inside an app context for the
+    uploading app so the model can reach its configuration and storage.
+    The profile is loaded again here so the write applies to its current
+    state rather than the request's copy. Until this finishes, profile
+    reads still return the previous avatar URL.
+    
+    Args:
+        app (Flask): App that handled the upload
+        user_id (str): Profile owner
+        avatar_url (str): URL of the uploaded avatar
+    """
+    with app.app_context():
+        try:
+            profile = UserProfile.get_by_id(user_id)
+            if not profile:
+                logger.warning(f"Profile {user_id} disappeared before its avatar URL was saved")
+                return
             
-        except requests.RequestException as e:
-            logger.error(f"Error communicating with Auth Service: {str(e)}")
-            return jsonify({'message': 'Authentication service unavailable, please try again later'}), 503
-        
-    return decorated
+            profile.avatar_url = avatar_url
+            profile.save()
+        except Exception as e:
+            logger.error(f"Error saving avatar URL for user {user_id}: {str(e)}")
+
+def _enqueue_avatar_save(user_id, avatar_url):
+    """Queue the profile update for an uploaded avatar on the avatar save executor"""
+    app = current_app._get_current_object()
+    _avatar_save_executor.submit(_persist_avatar_url, app, user_id, avatar_url)
 
-def admin_required(f):
-    """Decorator to require admin role"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        if request.user.get('role') != 'admin':
-            return jsonify({'message': 'Admin privileges required'}), 403
-        return f(*args, **kwargs)
-    return decorated
+def _json_response(obj):
+    """
+    Serialize a response body with orjson
+    
+    Used for the profile, settings and search payloads. Key order and the
+    handling of datetimes and other non-JSON types follow the app's JSON
+    provider, so output matches jsonify.
+    
+    Args:
+        obj: JSON-serializable response data
+        
+    Returns:
+        Response: application/json response
+    """
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if current_app.json.sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    body = orjson.dumps(obj, default=current_app.json.default, option=option)
+    return current_app.response_class(body, mimetype='application/json')
+
+# Fields clients may update; anything else in the request body is ignored
+PROFILE_FIELDS = ('display_name', 'bio', 'avatar_url', 'social_links')
+ADMIN_PROFILE_FIELDS = PROFILE_FIELDS + ('status',)
+SETTINGS_FIELDS = ('theme', 'notifications', 'privacy', 'language')
+
+def _apply_fields(target, data, fields):
+    """Copy the whitelisted fields present in data onto target"""
+    for field in fields:
+        if field in data:
+            setattr(target, field, data[field])
 
 # Profile Routes
 
+PROFILE_CACHE_MAX_AGE = 30  # Seconds clients may reuse a profile response
+
+def _profile_response(profile):
+    """
+    Build a cacheable profile response
+    
+    The ETag is a hash of the serialized profile, so a client sending a
+    matching If-None-Match gets an empty 304 instead of the body.
+    
+    Args:
+        profile (UserProfile): Profile to return
+        
+    Returns:
+        Response: 200 with the profile, or 304 Not Modified
+    """
+    response = _json_response(profile.to_dict())
+    response.add_etag()
+    response.headers['Cache-Control'] = f'private, max-age={PROFILE_CACHE_MAX_AGE}'
+    return response.make_conditional(request)
+
 @user_routes.route('/profile', methods=['GET'])
-@token_required
 def get_own_profile():
     """Get the current user's profile"""
     user_id = request.user.get('user_id')
@@ -97,13 +220,12 @@ def get_own_profile():
             )
             profile.save()
         
-        return jsonify(profile.to_dict())
+        return _profile_response(profile)
     except Exception as e:
         logger.error(f"Error getting user profile: {str(e)}")
         return jsonify({'message': 'Failed to retrieve user profile'}), 500
 
 @user_routes.route('/profile/<user_id>', methods=['GET'])
-@token_required
 def get_profile(user_id):
     """Get a specific user's profile"""
     try:
@@ -112,13 +234,12 @@ def get_profile(user_id):
         if not profile:
             return jsonify({'message': 'User profile not found'}), 404
         
-        return jsonify(profile.to_dict())
+        return _profile_response(profile)
     except Exception as e:
         logger.error(f"Error getting user profile {user_id}: {str(e)}")
         return jsonify({'message': 'Failed to retrieve user profile'}), 500
 
 @user_routes.route('/profile/username/<username>', methods=['GET'])
-@token_required
 def get_profile_by_username(username):
     """Get a profile by username"""
     try:
@@ -127,13 +248,12 @@ def get_profile_by_username(username):
         if not profile:
             return jsonify({'message': 'User profile not found'}), 404
         
-        return jsonify(profile.to_dict())
+        return _profile_response(profile)
     except Exception as e:
         logger.error(f"Error getting user profile for username {username}: {str(e)}")
         return jsonify({'message': 'Failed to retrieve user profile'}), 500
 
 @user_routes.route('/profile', methods=['PUT'])
-@token_required
 def update_profile():
     """Update the current user's profile"""
     user_id = request.user.get('user_id')
@@ -152,26 +272,17 @@ def update_profile():
         data = request.json
         
         # Update profile properties
-        if 'display_name' in data:
-            profile.display_name = data['display_name']
-        if 'bio' in data:
-            profile.bio = data['bio']
-        if 'avatar_url' in data:
-            profile.avatar_url = data['avatar_url']
-        if 'social_links' in data:
-            profile.social_links = data['social_links']
+        _apply_fields(profile, data, PROFILE_FIELDS)
         
         # Save updated profile
         profile.save()
         
-        return jsonify(profile.to_dict())
+        return _json_response(profile.to_dict())
     except Exception as e:
         logger.error(f"Error updating user profile: {str(e)}")
         return jsonify({'message': 'Failed to update user profile'}), 500
 
 @user_routes.route('/profile/<user_id>', methods=['PUT'])
-@token_required
-@admin_required
 def admin_update_profile(user_id):
     """Admin update a user's profile"""
     try:
@@ -183,28 +294,17 @@ def admin_update_profile(user_id):
         data = request.json
         
         # Update profile properties
-        if 'display_name' in data:
-            profile.display_name = data['display_name']
-        if 'bio' in data:
-            profile.bio = data['bio']
-        if 'avatar_url' in data:
-            profile.avatar_url = data['avatar_url']
-        if 'social_links' in data:
-            profile.social_links = data['social_links']
-        if 'status' in data:
-            profile.status = data['status']
+        _apply_fields(profile, data, ADMIN_PROFILE_FIELDS)
         
         # Save updated profile
         profile.save()
         
-        return jsonify(profile.to_dict())
+        return _json_response(profile.to_dict())
     except Exception as e:
         logger.error(f"Error updating user profile {user_id}: {str(e)}")
         return jsonify({'message': 'Failed to update user profile'}), 500
 
 @user_routes.route('/profile/<user_id>', methods=['DELETE'])
-@token_required
-@admin_required
 def delete_profile(user_id):
     """Delete a user's profile"""
     try:
@@ -224,7 +324,6 @@ def delete_profile(user_id):
 # Settings Routes
 
 @user_routes.route('/settings', methods=['GET'])
-@token_required
 def get_settings():
     """Get the current user's settings"""
     user_id = request.user.get('user_id')
@@ -232,13 +331,12 @@ def get_settings():
     try:
         settings = UserSettings.get_by_user_id(user_id)
         
-        return jsonify(settings.to_dict())
+        return _json_response(settings.to_dict())
     except Exception as e:
         logger.error(f"Error getting user settings: {str(e)}")
         return jsonify({'message': 'Failed to retrieve user settings'}), 500
 
 @user_routes.route('/settings', methods=['PUT'])
-@token_required
 def update_settings():
     """Update the current user's settings"""
     user_id = request.user.get('user_id')
@@ -249,39 +347,28 @@ def update_settings():
         data = request.json
         
         # Update settings properties
-        if 'theme' in data:
-            settings.theme = data['theme']
-        if 'notifications' in data:
-            settings.notifications = data['notifications']
-        if 'privacy' in data:
-            settings.privacy = data['privacy']
-        if 'language' in data:
-            settings.language = data['language']
+        _apply_fields(settings, data, SETTINGS_FIELDS)
         
         # Save updated settings
         settings.save()
         
-        return jsonify(settings.to_dict())
+        return _json_response(settings.to_dict())
     except Exception as e:
         logger.error(f"Error updating user settings: {str(e)}")
         return jsonify({'message': 'Failed to update user settings'}), 500
 
 @user_routes.route('/settings/<user_id>', methods=['GET'])
-@token_required
-@admin_required
 def admin_get_settings(user_id):
     """Admin get a user's settings"""
     try:
         settings = UserSettings.get_by_user_id(user_id)
         
-        return jsonify(settings.to_dict())
+        return _json_response(settings.to_dict())
     except Exception as e:
         logger.error(f"Error getting user settings for {user_id}: {str(e)}")
         return jsonify({'message': 'Failed to retrieve user settings'}), 500
 
 @user_routes.route('/settings/<user_id>', methods=['PUT'])
-@token_required
-@admin_required
 def admin_update_settings(user_id):
     """Admin update a user's settings"""
     try:
@@ -290,26 +377,18 @@ def admin_update_settings(user_id):
         data = request.json
         
         # Update settings properties
-        if 'theme' in data:
-            settings.theme = data['theme']
-        if 'notifications' in data:
-            settings.notifications = data['notifications']
-        if 'privacy' in data:
-            settings.privacy = data['privacy']
-        if 'language' in data:
-            settings.language = data['language']
+        _apply_fields(settings, data, SETTINGS_FIELDS)
         
         # Save updated settings
         settings.save()
         
-        return jsonify(settings.to_dict())
+        return _json_response(settings.to_dict())
     except Exception as e:
         logger.error(f"Error updating user settings for {user_id}: {str(e)}")
         return jsonify({'message': 'Failed to update user settings'}), 500
 
 # Avatar Upload Route
 @user_routes.route('/avatar', methods=['POST'])
-@token_required
 def upload_avatar():
     """Upload user avatar"""
     user_id = request.user.get('user_id')
@@ -329,27 +408,20 @@ def upload_avatar():
                 return jsonify({'message': 'No file selected'}), 400
             
             # Check file type
-            allowed_extensions = {'png', 'jpg', 'jpeg', 'gif'}
-            if '.' not in avatar_file.filename or \
-               avatar_file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+            extension = os.path.splitext(avatar_file.filename)[1][1:].lower()
+            if extension not in ALLOWED_AVATAR_EXTENSIONS:
                 return jsonify({'message': 'File type not allowed. Supported formats: PNG, JPG, JPEG, GIF'}), 400
             
             # Save file to uploads directory
-            filename = f"{user_id}_{int(time.time())}.{avatar_file.filename.rsplit('.', 1)[1].lower()}"
-            uploads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'avatars')
-            
-            # Create directory if it doesn't exist
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
+            filename = f"{user_id}_{secrets.token_hex(8)}.{extension}"
             
             # Save the file
-            avatar_path = os.path.join(uploads_dir, filename)
+            avatar_path = os.path.join(UPLOADS_DIR, filename)
             avatar_file.save(avatar_path)
             
-            # Update avatar URL in profile
+            # Update avatar URL in profile off the request path; the URL is already known
             avatar_url = f"/api/users/avatars/{filename}"
-            profile.avatar_url = avatar_url
-            profile.save()
+            _enqueue_avatar_save(user_id, avatar_url)
             
             return jsonify({'message': 'Avatar uploaded successfully', 'avatar_url': avatar_url})
         
@@ -371,29 +443,23 @@ def upload_avatar():
                 image_data = format_data[1]
                 
                 # Validate image format
-                if image_format not in ['png', 'jpeg', 'jpg', 'gif']:
+                if image_format not in ALLOWED_AVATAR_EXTENSIONS:
                     return jsonify({'message': 'Unsupported image format. Use PNG, JPEG, or GIF'}), 400
                 
-                # Decode base64 data
-                image_bytes = base64.b64decode(image_data)
+                # Reject oversized images before decoding anything
+                if len(image_data) > (MAX_AVATAR_BYTES + 2) // 3 * 4:
+                    return jsonify({'message': 'Image is too large (max 5 MB)'}), 413
                 
                 # Save to file
-                filename = f"{user_id}_{int(time.time())}.{image_format}"
-                uploads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'avatars')
-                
-                # Create directory if it doesn't exist
-                if not os.path.exists(uploads_dir):
-                    os.makedirs(uploads_dir)
+                filename = f"{user_id}_{secrets.token_hex(8)}.{image_format}"
                 
                 # Save the file
-                avatar_path = os.path.join(uploads_dir, filename)
-                with open(avatar_path, 'wb') as f:
-                    f.write(image_bytes)
+                avatar_path = os.path.join(UPLOADS_DIR, filename)
+                _write_base64_file(avatar_path, image_data)
                 
-                # Update avatar URL in profile
+                # Update avatar URL in profile off the request path; the URL is already known
                 avatar_url = f"/api/users/avatars/{filename}"
-                profile.avatar_url = avatar_url
-                profile.save()
+                _enqueue_avatar_save(user_id, avatar_url)
                 
                 return jsonify({'message': 'Avatar uploaded successfully', 'avatar_url': avatar_url})
             
@@ -411,13 +477,20 @@ def upload_avatar():
 # Serve avatar files
 @user_routes.route('/avatars/<filename>', methods=['GET'])
 def get_avatar(filename):
-    """Serve avatar file"""
-    uploads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'avatars')
-    return send_from_directory(uploads_dir, filename)
+    """
+    Serve avatar file
+    
+    Each upload gets a new random filename, so a given avatar URL never
+    changes content and can be cached as immutable. Conditional requests get
+    a 304, and when the app sets USE_X_SENDFILE the file is handed to the
+    front-end server instead of being streamed through Python.
+    """
+    response = send_from_directory(UPLOADS_DIR, filename, conditional=True, max_age=AVATAR_CACHE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={AVATAR_CACHE_MAX_AGE}, immutable'
+    return response
 
 # User Search Route
 @user_routes.route('/search', methods=['GET'])
-@token_required
 def search_users():
     """Search for users by username or display name"""
     # Get search query
@@ -447,31 +520,29 @@ def search_users():
         
         # Filter profiles by query
         query = query.lower()
+        current_user_id = request.user.get('user_id')
         
-        # Check for matches in display name, username, or bio
-        filtered_profiles = []
+        # Count every match but only keep the requested page
+        total = 0
+        results = []
         
         for profile in profiles:
             # Check if user is the current user - don't include self in results
-            if profile.user_id == request.user.get('user_id'):
+            if profile.user_id == current_user_id:
                 continue
-                
-            # Check for matches
+            
+            # Check for matches in display name, username, or bio
             if (profile.display_name and query in profile.display_name.lower()) or \
                (profile.username and query in profile.username.lower()) or \
                (profile.bio and query in profile.bio.lower()):
-                filtered_profiles.append(profile)
-        
-        # Apply pagination
-        paginated_profiles = filtered_profiles[offset:offset + limit] if filtered_profiles else []
-        
-        # Convert profiles to dictionary
-        results = [profile.to_dict() for profile in paginated_profiles]
+                if offset <= total < offset + limit:
+                    results.append(profile.to_dict())
+                total += 1
         
         # Return search results
-        return jsonify({
+        return _json_response({
             'query': query,
-            'total': len(filtered_profiles),
+            'total': total,
             'limit': limit,
             'offset': offset,
             'users': results
@@ -479,4 +550,70 @@ def search_users():
     
     except Exception as e:
         logger.error(f"Error searching users: {str(e)}")
-        return jsonify({'message': 'Failed to search users'}), 500 
\ No newline at end of file
+        return jsonify({'message': 'Failed to search users'}), 500 
+
+# Batch Route
+def _run_batch_operation(adapter, operation):
+    """
+    Run one read-only sub-request of a batch
+    
+    The view runs in its own request context (so it sees the operation's
+    path and query parameters) and reuses the batch caller's request.user.
+    
+    Args:
+        adapter (MapAdapter): URL adapter bound to the current request
+        operation (dict): {'path': str, 'params': dict}
+        
+    Returns:
+        dict: {'path', 'status', 'body'}
+    """
+    path = operation.get('path') if isinstance(operation, dict) else None
+    if not isinstance(path, str):
+        return {'path': path, 'status': 400, 'body': {'message': 'Operation path is required'}}
+    
+    params = operation.get('params') or {}
+    if not isinstance(params, dict):
+        return {'path': path, 'status': 400, 'body': {'message': 'Operation params must be an object'}}
+    
+    try:
+        endpoint, values = adapter.match(path, method='GET')
+    except HTTPException as e:
+        return {'path': path, 'status': e.code, 'body': {'message': e.description}}
+    
+    view_name = endpoint.rsplit('.', 1)[-1]
+    if not endpoint.startswith(f"{user_routes.name}.") or view_name in _BATCH_EXCLUDED_ENDPOINTS:
+        return {'path': path, 'status': 400, 'body': {'message': 'Operation cannot be batched'}}
+    
+    if view_name in _ADMIN_ENDPOINTS and not g.is_admin:
+        return {'path': path, 'status': 403, 'body': {'message': 'Admin privileges required'}}
+    
+    # A failing operation becomes its own error entry instead of failing the batch
+    user = request.user
+    try:
+        with current_app.test_request_context(path, method='GET', query_string=params):
+            request.user = user
+            response = current_app.make_response(current_app.view_functions[endpoint](**values))
+    except HTTPException as e:
+        return {'path': path, 'status': e.code, 'body': {'message': e.description}}
+    except Exception as e:
+        logger.error(f"Error running batch operation {path}: {str(e)}")
+        return {'path': path, 'status': 500, 'body': {'message': 'Operation failed'}}
+    
+    return {'path': path, 'status': response.status_code, 'body': response.get_json(silent=True)}
+
+@user_routes.route('/batch', methods=['POST'])
+def batch():
+    """Run several GET requests (profile, settings, search) with a single authentication"""
+    data = request.get_json(silent=True) or {}
+    pipeline = data.get('pipeline')
+    
+    if not isinstance(pipeline, list) or not pipeline:
+        return jsonify({'message': 'A non-empty pipeline list is required'}), 400
+    
+    if len(pipeline) > BATCH_MAX_OPERATIONS:
+        return jsonify({'message': f'A batch can contain at most {BATCH_MAX_OPERATIONS} operations'}), 400
+    
+    adapter = current_app.url_map.bind_to_environ(request.environ)
+    results = [_run_batch_operation(adapter, operation) for operation in pipeline]
+    
+    return jsonify({'results': results})
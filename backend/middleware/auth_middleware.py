@@ -3,22 +3,76 @@ Auth Middleware for ABDRE Chat Application
 Handles request authentication and user context
 """
 
+import hashlib
 import logging
+import os
+import threading
+import time
+import cachetools
 import jwt
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import g, request, redirect, current_app
 
+from backend.utils.jwt_utils import JWTCodec
+
 logger = logging.getLogger(__name__)
 
 # JWT Secret key - should match the one in auth_controller
-JWT_SECRET = 'your-secret-key-here'  # In production, use env var
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-here')
+
+# Token codec with the HS256 key prepared once for every request
+_jwt_codec = JWTCodec(JWT_SECRET)
+
+# Endpoints and path prefixes whose responses never depend on the caller
+_NOAUTH_ENDPOINTS = frozenset({'static'})
+_NOAUTH_PATH_PREFIXES = ('/static/',)
+
+# Verified token payloads keyed by token digest, so repeat requests skip decoding
+TOKEN_PAYLOAD_CACHE_TTL = 30
+_token_payload_cache = cachetools.TTLCache(maxsize=10000, ttl=TOKEN_PAYLOAD_CACHE_TTL)
+
+# TTLCache is not thread-safe; guards the cache above
+_token_payload_lock = threading.Lock()
+
+def _decode_token(token):
+    """
+    Decode and verify a token, reusing a recent verification of the same token
+    
+    Tokens without an exp claim are rejected, and a cached payload is only
+    returned while its exp is in the future.
+    
+    Args:
+        token (str): Encoded token
+        
+    Returns:
+        dict: Token payload (shared; treat as read-only)
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    with _token_payload_lock:
+        payload = _token_payload_cache.get(key)
+    
+    if payload is not None and payload.get('exp', 0) > time.time():
+        return payload
+    
+    payload = _jwt_codec.decode(token)
+    if 'exp' not in payload:
+        raise jwt.MissingRequiredClaimError('exp')
+    
+    with _token_payload_lock:
+        _token_payload_cache[key] = payload
+    return payload
 
 def init_auth_middleware(app):
     """Initialize authentication middleware"""
     @app.before_request
     def check_auth():
         """Check authentication for all requests"""
+        # Static files are served the same to everyone
+        if request.endpoint in _NOAUTH_ENDPOINTS or request.path.startswith(_NOAUTH_PATH_PREFIXES):
+            g.user = None
+            return None
+        
         # Get token from cookies or Authorization header
         token = request.cookies.get('auth_token')
         
@@ -33,14 +87,8 @@ def init_auth_middleware(app):
             return None
         
         try:
-            # Decode token
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-            
-            # Check token expiration
-            exp = payload.get('exp', 0)
-            if datetime.utcnow().timestamp() > exp:
-                g.user = None
-                return None
+            # Decode token; expired tokens raise ExpiredSignatureError
+            payload = _decode_token(token)
             
             # Check if it's a guest token
             if payload.get('is_guest', False):
@@ -54,6 +102,7 @@ def init_auth_middleware(app):
                 g.user = {
                     'user_id': payload.get('user_id'),
                     'username': payload.get('username'),
+                    'role': payload.get('role'),
                     'is_authenticated': True
                 }
             
@@ -97,7 +146,7 @@ def get_auth_token(user_data):
         }
     
     # Generate token
-    token = jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+    token = _jwt_codec.encode(payload)
     
     return token
 
@@ -3,15 +3,24 @@ ABDRE Chat Realtime Service
 Provides WebSocket/Socket.IO server for real-time communication
 """
 
+# Patch the standard library for gevent before anything else imports it
+from gevent import monkey
+monkey.patch_all()
+
 import os
 import sys
+import hashlib
 import logging
 import json
 import uuid
 import time
+import threading
+from dataclasses import dataclass, field
 from flask import Flask, request, jsonify
-from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask_socketio import SocketIO, emit, join_room, leave_room, ConnectionRefusedError
+import cachetools
 import jwt
+import orjson
 
 # Configure logging
 logging.basicConfig(
@@ -26,21 +35,59 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key_for_development_only')
 
 # JWT Secret key - should match the one in auth_middleware
-JWT_SECRET = 'your-secret-key-here'  # In production, use env var
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-here')
+
+# Debug mode; also enables the literal "guest" token for testing
+DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
+
+# Verified token payloads keyed by token digest, so reconnects with the same token skip the decode
+TOKEN_PAYLOAD_CACHE_TTL = 30
+_token_payload_cache = cachetools.TTLCache(maxsize=10000, ttl=TOKEN_PAYLOAD_CACHE_TTL)
 
-# Initialize Socket.IO
+# TTLCache is not thread-safe; guards the cache above
+_token_payload_lock = threading.Lock()
+
+class _OrjsonPacketCodec:
+    """
+    json module stand-in that encodes Socket.IO packets with orjson
+    
+    Socket.IO only calls dumps and loads; orjson output is already compact,
+    so the separators argument it passes is ignored.
+    """
+    
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+# Initialize Socket.IO on gevent so each connection is a greenlet, not an OS thread
 socketio = SocketIO(
     app, 
     cors_allowed_origins="*", 
-    json=json,
-    async_mode='threading',
+    json=_OrjsonPacketCodec,
+    async_mode='gevent',
     path='/socket.io'
 )
 
+@dataclass(slots=True)
+class Client:
+    """State kept for one connected Socket.IO client"""
+    sid: str
+    connected_at: float
+    authenticated: bool = False
+    user_id: str = None
+    username: str = None
+    # Clients opt into batched typing/read receipt delivery in the connect payload
+    supports_batch: bool = False
+    rooms: set = field(default_factory=set)
+
 # Active client connections
 active_clients = {}
 
-# Map of username to socket ID
+# Map of user ID to the set of that user's socket IDs
 user_sockets = {}
 
 # Map of chat rooms and their participants
@@ -49,6 +96,109 @@ chat_rooms = {}
 # Status map: user_id -> status
 user_status = {}
 
+# Most rooms one join_many event may join
+MAX_JOIN_MANY_ROOMS = 100
+
+# Typing and read receipt events for clients that opted into batching are
+# held per room and sent as one 'batch' packet per window
+BATCH_INTERVAL_SECONDS = 0.05
+pending_batches = {}
+_batch_lock = threading.Lock()
+_batch_flusher_started = False
+
+# Socket IDs of batching clients per room; rooms without any are never batched
+batch_room_members = {}
+
+def _batch_room(room_id):
+    """Socket.IO room of the chat's members that receive batched events"""
+    return f'{room_id}:batch'
+
+def _live_room(room_id):
+    """Socket.IO room of the chat's members that receive each event as it happens"""
+    return f'{room_id}:live'
+
+def _join_delivery_room(client, room_id):
+    """Put the current socket in the room matching how it takes typing/read receipts"""
+    if client.supports_batch:
+        join_room(_batch_room(room_id))
+        batch_room_members.setdefault(room_id, set()).add(client.sid)
+    else:
+        join_room(_live_room(room_id))
+
+def _drop_batch_member(room_id, sid):
+    """Forget a socket as a batching member of a room"""
+    members = batch_room_members.get(room_id)
+    if members is not None:
+        members.discard(sid)
+        if not members:
+            del batch_room_members[room_id]
+
+def _flush_batches():
+    """Send each room's pending batch once per batching window"""
+    while True:
+        socketio.sleep(BATCH_INTERVAL_SECONDS)
+        
+        with _batch_lock:
+            if not pending_batches:
+                continue
+            batches = dict(pending_batches)
+            pending_batches.clear()
+        
+        for room_id, batch in batches.items():
+            typing_sids = batch.pop('typing_sids', {})
+            batch['room'] = room_id
+            batch['timestamp'] = time.time()
+            
+            # Like the live typing event, a batch doesn't echo a socket's own
+            # typing back to it; those sockets get a copy without their entry
+            members = batch_room_members.get(room_id, ())
+            senders = [sid for sid in typing_sids if sid in members]
+            socketio.emit('batch', batch, room=_batch_room(room_id), skip_sid=senders or None)
+            
+            for sid in senders:
+                own_batch = dict(batch)
+                typing = {user_id: value for user_id, value in batch['typing'].items() if user_id != typing_sids[sid]}
+                if typing:
+                    own_batch['typing'] = typing
+                else:
+                    del own_batch['typing']
+                    if 'read_receipts' not in own_batch:
+                        continue
+                socketio.emit('batch', own_batch, to=sid)
+
+def _queue_batch_event(room_id, kind, user_id, value, sid):
+    """
+    Add an event to a room's pending batch
+    
+    Does nothing when no batching client is in the room. A later typing
+    event from the same user replaces the earlier one; read receipts
+    accumulate their message IDs.
+    
+    Args:
+        room_id (str): Chat room
+        kind (str): 'typing' or 'read_receipts'
+        user_id (str): User the event is about
+        value: Typing flag, or list of message IDs read
+        sid (str): Socket that sent the event
+    """
+    global _batch_flusher_started
+    
+    if room_id not in batch_room_members:
+        return
+    
+    with _batch_lock:
+        batch = pending_batches.setdefault(room_id, {})
+        events = batch.setdefault(kind, {})
+        if kind == 'read_receipts':
+            events.setdefault(user_id, []).extend(value)
+        else:
+            events[user_id] = value
+            batch.setdefault('typing_sids', {})[sid] = user_id
+        
+        if not _batch_flusher_started:
+            _batch_flusher_started = True
+            socketio.start_background_task(_flush_batches)
+
 @app.route('/health')
 def health_check():
     """Health check endpoint for the realtime service"""
@@ -84,6 +234,31 @@ def log_client_file():
         logger.error(f"Error recording file log: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def _decode_token(token):
+    """
+    Decode and verify a token, reusing a recent verification of the same token
+    
+    Tokens without an exp claim are rejected, and a cached payload is only
+    returned while its exp is in the future.
+    
+    Args:
+        token (str): JWT token without the Bearer prefix
+        
+    Returns:
+        dict: Token payload (shared; treat as read-only)
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    with _token_payload_lock:
+        payload = _token_payload_cache.get(key)
+    
+    if payload is not None and payload['exp'] > time.time():
+        return payload
+    
+    payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'], options={'require': ['exp']})
+    with _token_payload_lock:
+        _token_payload_cache[key] = payload
+    return payload
+
 def authenticate_token(token):
     """
     Authenticate JWT token and return user info
@@ -97,8 +272,8 @@ def authenticate_token(token):
     if not token:
         return None
     
-    # For testing/debugging, accept "guest" token
-    if token == 'guest':
+    # For testing/debugging, accept "guest" token in debug mode only
+    if token == 'guest' and DEBUG:
         return {
             'user_id': f'guest_{str(uuid.uuid4())}',
             'username': 'Guest',
@@ -111,7 +286,7 @@ def authenticate_token(token):
             token = token[7:]
             
         # Decode token
-        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        payload = _decode_token(token)
         
         # Guest token handling
         if payload.get('is_guest', False):
@@ -140,24 +315,43 @@ def authenticate_token(token):
         return None
 
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     client_id = str(uuid.uuid4())
-    active_clients[client_id] = {
-        'sid': request.sid,
-        'authenticated': False,
-        'user_id': None,
-        'connected_at': time.time(),
-        'rooms': []
-    }
-    
-    logger.info(f"Client connected: {request.sid}, total clients: {len(active_clients)}")
+    connected_at = time.time()
+    if not isinstance(auth, dict):
+        auth = {}
+    
+    client = Client(
+        sid=request.sid,
+        connected_at=connected_at,
+        supports_batch=bool(auth.get('supports_batch'))
+    )
+    
+    # Verify the token once per connection; sockets without a valid token are
+    # refused, so every client in active_clients is authenticated
+    user = authenticate_token(auth.get('token') or request.args.get('token'))
+    user_id = user.get('user_id') if user else None
+    if not isinstance(user_id, str) or not user_id:
+        logger.warning(f'Refused unauthenticated connection: {request.sid}')
+        raise ConnectionRefusedError('Unauthorized')
+    
+    client.authenticated = True
+    client.user_id = sys.intern(user_id)
+    client.username = user.get('username')
+    user_sockets.setdefault(client.user_id, set()).add(request.sid)
+    
+    # Handlers look clients up by socket ID
+    active_clients[request.sid] = client
+    active_connections = len(active_clients)
+    
+    logger.info(f"Client connected: {request.sid}, total clients: {active_connections}")
     
     # Send welcome message
     emit('connection_status', {
         'status': 'connected',
         'client_id': client_id, 
-        'server_time': time.time(),
-        'active_connections': len(active_clients),
+        'server_time': connected_at,
+        'active_connections': active_connections,
         'server_load': 'normal'
     })
 
@@ -168,22 +362,29 @@ def handle_disconnect():
     
     if client_id in active_clients:
         client = active_clients[client_id]
-        user_id = client.get('user_id')
+        user_id = client.user_id
         
         # Remove from user socket mapping
-        if user_id in user_sockets and user_sockets[user_id] == client_id:
-            del user_sockets[user_id]
+        sockets = user_sockets.get(user_id)
+        if sockets is not None:
+            sockets.discard(client_id)
+            if not sockets:
+                del user_sockets[user_id]
         
-        # Leave all rooms and notify other participants
-        rooms = list(client.get('rooms', set()))
-        for room in rooms:
-            if room in chat_rooms and user_id in chat_rooms[room]:
-                chat_rooms[room].remove(user_id)
+        # Leave all rooms and notify other participants; the client is about
+        # to be dropped, so its room set is iterated without copying
+        for room in client.rooms:
+            if client.supports_batch:
+                _drop_batch_member(room, client_id)
+            
+            participants = chat_rooms.get(room)
+            if participants and user_id in participants:
+                participants.remove(user_id)
                 
                 # Notify others in room
                 emit('user_offline', {
                     'user_id': user_id,
-                    'username': client.get('username'),
+                    'username': client.username,
                     'timestamp': time.time()
                 }, room=room)
         
@@ -217,13 +418,14 @@ def handle_join(data):
         return
     
     client = active_clients[client_id]
-    user_id = client.get('user_id')
+    user_id = client.user_id
     
-    # Join room
+    # Join room, plus the room matching how this client takes typing/read receipts
     join_room(room_id)
+    _join_delivery_room(client, room_id)
     
     # Add to client's rooms
-    client['rooms'].add(room_id)
+    client.rooms.add(room_id)
     
     # Add to chat room participants
     if room_id not in chat_rooms:
@@ -241,10 +443,71 @@ def handle_join(data):
     # Notify others in room
     emit('user_joined', {
         'user_id': user_id,
-        'username': client.get('username'),
+        'username': client.username,
         'timestamp': time.time()
     }, room=room_id, include_self=False)
 
+@socketio.on('join_many')
+def handle_join_many(data=None):
+    """
+    Handle joining several rooms in one event
+    
+    Lets a client enter all of its chats on connect with a single round
+    trip instead of one 'join' event per room.
+    
+    Args:
+        data (dict): Data containing a list of room IDs
+    """
+    client_id = request.sid
+    
+    if client_id not in active_clients:
+        logger.warning(f'Unauthorized join attempt: {client_id}')
+        emit('error', {'message': 'Unauthorized'})
+        return
+    
+    # Get room info, dropping empty, non-string and repeated IDs
+    room_ids = data.get('rooms') if isinstance(data, dict) else None
+    if isinstance(room_ids, list):
+        room_ids = list(dict.fromkeys(
+            room_id for room_id in room_ids if isinstance(room_id, str) and room_id
+        ))
+    if not room_ids or not isinstance(room_ids, list):
+        emit('error', {'message': 'Room IDs required'})
+        return
+    
+    if len(room_ids) > MAX_JOIN_MANY_ROOMS:
+        emit('error', {'message': f'At most {MAX_JOIN_MANY_ROOMS} rooms per request'})
+        return
+    
+    client = active_clients[client_id]
+    user_id = client.user_id
+    
+    # Join rooms, plus the rooms matching how this client takes typing/read receipts
+    for room_id in room_ids:
+        join_room(room_id)
+        _join_delivery_room(client, room_id)
+        chat_rooms.setdefault(room_id, set()).add(user_id)
+    
+    # Add to client's rooms
+    client.rooms.update(room_ids)
+    
+    logger.info(f'Client {client_id} joined {len(room_ids)} rooms')
+    
+    # Notify client
+    emit('join_success', {
+        'rooms': room_ids,
+        'user_id': user_id
+    })
+    
+    # Notify others in each room
+    joined_at = time.time()
+    for room_id in room_ids:
+        emit('user_joined', {
+            'user_id': user_id,
+            'username': client.username,
+            'timestamp': joined_at
+        }, room=room_id, include_self=False)
+
 @socketio.on('leave')
 def handle_leave(data):
     """
@@ -266,14 +529,16 @@ def handle_leave(data):
         return
     
     client = active_clients[client_id]
-    user_id = client.get('user_id')
+    user_id = client.user_id
     
     # Leave room
     leave_room(room_id)
+    leave_room(_batch_room(room_id))
+    leave_room(_live_room(room_id))
+    _drop_batch_member(room_id, client_id)
     
     # Remove from client's rooms
-    if room_id in client['rooms']:
-        client['rooms'].remove(room_id)
+    client.rooms.discard(room_id)
     
     # Remove from chat room participants
     if room_id in chat_rooms and user_id in chat_rooms[room_id]:
@@ -310,10 +575,10 @@ def handle_message(data):
         return
     
     client = active_clients[client_id]
-    user_id = client.get('user_id')
+    user_id = client.user_id
     
     # Validate user is in the room
-    if room_id not in client.get('rooms', set()):
+    if room_id not in client.rooms:
         emit('error', {'message': 'You are not in this room'})
         return
     
@@ -323,7 +588,7 @@ def handle_message(data):
         'id': message_id,
         'room': room_id,
         'sender': user_id,
-        'sender_name': client.get('username'),
+        'sender_name': client.username,
         'content': content,
         'timestamp': time.time()
     }
@@ -331,34 +596,25 @@ def handle_message(data):
     # Send to room
     emit('chat_message', message, room=room_id)
     
-    # Send unread count update to all recipients except sender
-    if room_id in chat_rooms:
-        for recipient_id in chat_rooms[room_id]:
-            # Skip sender
-            if recipient_id == user_id:
-                continue
-                
-            # Get recipient socket
-            if recipient_id in user_sockets:
-                recipient_socket = user_sockets[recipient_id]
-                
-                # Send unread count update
-                emit('unread_count_update', {
-                    'count': 1,  # Increment by 1
-                    'increment': True,  # Signal this is an increment
-                    'chats': {
-                        room_id: {
-                            'count': 1,
-                            'increment': True,
-                            'last_message': {
-                                'id': message_id,
-                                'sender': user_id,
-                                'content': content,
-                                'timestamp': time.time()
-                            }
-                        }
-                    }
-                }, room=recipient_socket)
+    # Send unread count update to everyone else in the room, skipping all of
+    # the sender's sockets; one emit to the room encodes the packet once
+    # instead of once per recipient socket
+    emit('unread_count_update', {
+        'count': 1,  # Increment by 1
+        'increment': True,  # Signal this is an increment
+        'chats': {
+            room_id: {
+                'count': 1,
+                'increment': True,
+                'last_message': {
+                    'id': message_id,
+                    'sender': user_id,
+                    'content': content,
+                    'timestamp': message['timestamp']
+                }
+            }
+        }
+    }, room=room_id, skip_sid=list(user_sockets.get(user_id, ())))
     
     logger.info(f'Message sent in room {room_id} by {user_id}')
     
@@ -390,14 +646,19 @@ def handle_typing(data):
         return
     
     client = active_clients[client_id]
-    user_id = client.get('user_id')
+    user_id = client.user_id
     
-    # Send to room except sender
+    # Validate user is in the room
+    if room_id not in client.rooms:
+        return
+    
+    # Send to room except sender; batching clients get it with the next batch
     emit('typing', {
         'user_id': user_id,
         'typing': is_typing,
         'timestamp': time.time()
-    }, room=room_id, include_self=False)
+    }, room=_live_room(room_id), include_self=False)
+    _queue_batch_event(room_id, 'typing', user_id, is_typing, client_id)
 
 @socketio.on('read_receipt')
 def handle_read_receipt(data):
@@ -420,19 +681,20 @@ def handle_read_receipt(data):
         return
     
     client = active_clients[client_id]
-    user_id = client.get('user_id')
+    user_id = client.user_id
     
     # Validate user is in the room
-    if room_id not in client.get('rooms', set()):
+    if room_id not in client.rooms:
         return
     
-    # Send read receipt to everyone in the room
+    # Send read receipt to everyone in the room; batching clients get it with the next batch
     emit('read_receipt', {
         'user_id': user_id,
         'room': room_id,
         'message_ids': message_ids,
         'timestamp': time.time()
-    }, room=room_id)
+    }, room=_live_room(room_id))
+    _queue_batch_event(room_id, 'read_receipts', user_id, message_ids, client_id)
     
     # Also update unread count for this user
     # In a real system, this would decrease the counts
@@ -458,7 +720,7 @@ def handle_unread_count():
         return
     
     client = active_clients[client_id]
-    user_id = client.get('user_id')
+    user_id = client.user_id
     
     # In a real implementation, this would query a database
     # For this demo, we'll send a random count
@@ -468,7 +730,7 @@ def handle_unread_count():
     unread_data = {}
     total_count = 0
     
-    for room in client.get('rooms', set()):
+    for room in client.rooms:
         # Random count between 0-3 for demo
         count = min(int(time.time() % 4), 3)
         if count > 0:
@@ -505,13 +767,13 @@ def handle_user_status(data):
         return
     
     client = active_clients[client_id]
-    user_id = client.get('user_id')
+    user_id = client.user_id
     
     # Update status
     user_status[user_id] = status
     
     # Send to all rooms the user is in
-    for room in client.get('rooms', set()):
+    for room in client.rooms:
         emit('user_status', {
             'user_id': user_id,
             'status': status,
@@ -527,9 +789,10 @@ def handle_ping(data):
         data (dict): Ping data
     """
     # Return a pong with the current timestamp
+    now = time.time()
     emit('pong', {
-        'timestamp': time.time(),
-        'server_time': time.time(),
+        'timestamp': now,
+        'server_time': now,
         'client_time': data.get('timestamp')
     })
 
@@ -547,7 +810,6 @@ def handle_error(data):
 if __name__ == '__main__':
     host = os.environ.get('HOST', '0.0.0.0')
     port = int(os.environ.get('PORT', 5001))
-    debug = os.environ.get('DEBUG', 'False').lower() == 'true'
     
-    logger.info(f'Starting ABDRE Chat Realtime Service on {host}:{port}, debug={debug}')
-    socketio.run(app, host=host, port=port, debug=debug, allow_unsafe_werkzeug=True) 
\ No newline at end of file
+    logger.info(f'Starting ABDRE Chat Realtime Service on {host}:{port}, debug={DEBUG}')
+    socketio.run(app, host=host, port=port, debug=DEBUG) 
\ No newline at end of file
@@ -4,17 +4,58 @@ Handles data access for chat and message operations
 """
 
 import logging
-import json
+import sqlite3
+import threading
 from datetime import datetime
 import uuid
 import os
 
+import orjson
+
 logger = logging.getLogger(__name__)
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_chats (
+    user_id TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, chat_id)
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    message_id TEXT,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_chat_created ON messages(chat_id, created_at, seq);
+CREATE INDEX IF NOT EXISTS idx_messages_message_id ON messages(message_id);
+
+CREATE TABLE IF NOT EXISTS read_status (
+    chat_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    is_read INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, user_id)
+);
+"""
+
+def _to_json(record):
+    """Serialize a record as the JSON text kept in the data columns"""
+    return orjson.dumps(record).decode()
+
 class ChatRepository:
     """
     Repository for chat data access operations
     Handles persistence and retrieval of chat and message data
+    
+    Data lives in SQLite in WAL mode, one row per chat, message and read
+    marker, so each operation writes only the rows it touches. Connections
+    are opened per thread.
     """
     
     def __init__(self, db_path=None):
@@ -24,46 +65,90 @@ class ChatRepository:
         Args:
             db_path (str): Optional path to database file
         """
-        self.db_path = db_path or os.environ.get('CHAT_DB_PATH', 'chat_service/data/chats.json')
-        self._db = None
+        path = db_path or os.environ.get('CHAT_DB_PATH', 'chat_service/data/chats.db')
+        root, extension = os.path.splitext(path)
+        
+        # Older configurations point at the JSON file the repository used to keep
+        if extension == '.json':
+            path = root + '.db'
+        
+        self.db_path = path
+        self._legacy_path = root + '.json'
+        self._local = threading.local()
         self._load_db()
     
+    def _conn(self):
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
     def _load_db(self):
-        """Load database from file or initialize if not exists"""
+        """Create the schema, importing the legacy JSON database into a new one"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn().executescript(_SCHEMA)
+        
         try:
-            if os.path.exists(self.db_path):
-                with open(self.db_path, 'r') as f:
-                    self._db = json.load(f)
-            else:
-                # Initialize empty database
-                self._db = {
-                    'chats': {},
-                    'messages': {},
-                    'user_chats': {},
-                    'read_status': {}
-                }
-                # Create directory if needed
-                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-                self._save_db()
-                
-            logger.info(f"Loaded chat database from {self.db_path}")
+            self._import_legacy_db()
         except Exception as e:
-            logger.error(f"Error loading chat database: {str(e)}")
-            # Initialize empty database as fallback
-            self._db = {
-                'chats': {},
-                'messages': {},
-                'user_chats': {},
-                'read_status': {}
-            }
+            logger.error(f"Error importing chat database from {self._legacy_path}: {str(e)}")
+        
+        logger.info(f"Loaded chat database from {self.db_path}")
     
-    def _save_db(self):
-        """Save database to file"""
+    def _import_legacy_db(self):
+        """Copy chats.json into the database if the database has no chats yet"""
+        conn = self._conn()
+        if not os.path.exists(self._legacy_path):
+            return
+        if conn.execute('SELECT 1 FROM chats LIMIT 1').fetchone():
+            return
+        
+        with open(self._legacy_path, 'rb') as f:
+            legacy = orjson.loads(f.read())
+        
+        conn.execute('BEGIN IMMEDIATE')
         try:
-            with open(self.db_path, 'w') as f:
-                json.dump(self._db, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving chat database: {str(e)}")
+            conn.executemany(
+                'INSERT OR REPLACE INTO chats (chat_id, data) VALUES (?, ?)',
+                ((chat_id, _to_json(chat)) for chat_id, chat in legacy.get('chats', {}).items())
+            )
+            conn.executemany(
+                'INSERT OR IGNORE INTO user_chats (user_id, chat_id) VALUES (?, ?)',
+                (
+                    (user_id, chat_id)
+                    for user_id, chat_ids in legacy.get('user_chats', {}).items()
+                    for chat_id in chat_ids
+                )
+            )
+            conn.executemany(
+                'INSERT INTO messages (chat_id, message_id, created_at, data) VALUES (?, ?, ?, ?)',
+                (
+                    (chat_id, message.get('message_id'), message.get('created_at', ''), _to_json(message))
+                    for chat_id, messages in legacy.get('messages', {}).items()
+                    for message in messages
+                )
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO read_status (chat_id, user_id, is_read) VALUES (?, ?, ?)',
+                (
+                    (*read_key.split(':', 1), int(bool(is_read)))
+                    for read_key, is_read in legacy.get('read_status', {}).items()
+                    if ':' in read_key
+                )
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        
+        logger.info(f"Imported chat database from {self._legacy_path}")
     
     def get_chat(self, chat_id):
         """
@@ -71,11 +156,12 @@ class ChatRepository:
         
         Args:
             chat_id (str): Chat ID to retrieve
-            
+        
         Returns:
             dict: Chat object or None if not found
         """
-        return self._db['chats'].get(chat_id)
+        row = self._conn().execute('SELECT data FROM chats WHERE chat_id = ?', (chat_id,)).fetchone()
+        return orjson.loads(row[0]) if row else None
     
     def get_chats_by_user(self, user_id):
         """
@@ -83,23 +169,30 @@ class ChatRepository:
         
         Args:
             user_id (str): User ID to get chats for
-            
+        
         Returns:
             list: List of chat objects
         """
-        # Get chat IDs for user
-        chat_ids = self._db['user_chats'].get(user_id, [])
+        rows = self._conn().execute(
+            """
+            SELECT chats.data, read_status.is_read
+            FROM user_chats
+            JOIN chats ON chats.chat_id = user_chats.chat_id
+            LEFT JOIN read_status
+                ON read_status.chat_id = user_chats.chat_id AND read_status.user_id = user_chats.user_id
+            WHERE user_chats.user_id = ?
+            ORDER BY user_chats.rowid
+            """,
+            (user_id,)
+        )
         
-        # Get chat objects
         chats = []
-        for chat_id in chat_ids:
-            chat = self.get_chat(chat_id)
-            if chat:
-                # Add read status
-                read_key = f"{chat_id}:{user_id}"
-                chat['unread'] = not self._db['read_status'].get(read_key, True)
-                chats.append(chat)
-                
+        for data, is_read in rows:
+            chat = orjson.loads(data)
+            # Chats without a read marker count as read
+            chat['unread'] = is_read == 0
+            chats.append(chat)
+        
         return chats
     
     def create_chat(self, chat):
@@ -108,34 +201,39 @@ class ChatRepository:
         
         Args:
             chat (dict): Chat object to create
-            
+        
         Returns:
             bool: Success or failure
         """
+        conn = self._conn()
         try:
             chat_id = chat['chat_id']
+            participants = chat.get('participants', [])
             
-            # Add to chats
-            self._db['chats'][chat_id] = chat
-            
-            # Update user_chats for each participant
-            for user_id in chat.get('participants', []):
-                if user_id not in self._db['user_chats']:
-                    self._db['user_chats'][user_id] = []
-                    
-                if chat_id not in self._db['user_chats'][user_id]:
-                    self._db['user_chats'][user_id].append(chat_id)
-                    
-                # Initialize messages collection
-                if chat_id not in self._db['messages']:
-                    self._db['messages'][chat_id] = []
-                    
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Add to chats
+                conn.execute(
+                    'INSERT OR REPLACE INTO chats (chat_id, data) VALUES (?, ?)',
+                    (chat_id, _to_json(chat))
+                )
+                
+                # Update user_chats for each participant
+                conn.executemany(
+                    'INSERT OR IGNORE INTO user_chats (user_id, chat_id) VALUES (?, ?)',
+                    ((user_id, chat_id) for user_id in participants)
+                )
+                
                 # Mark as read for creator, unread for others
-                read_key = f"{chat_id}:{user_id}"
-                self._db['read_status'][read_key] = (user_id == chat.get('created_by'))
+                conn.executemany(
+                    'INSERT OR REPLACE INTO read_status (chat_id, user_id, is_read) VALUES (?, ?, ?)',
+                    ((chat_id, user_id, int(user_id == chat.get('created_by'))) for user_id in participants)
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
             
-            # Save changes
-            self._save_db()
             return True
             
         except Exception as e:
@@ -149,20 +247,15 @@ class ChatRepository:
         Args:
             chat_id (str): Chat ID to add message to
             message (dict): Message object to add
-            
+        
         Returns:
             bool: Success or failure
         """
         try:
-            # Create messages list for chat if needed
-            if chat_id not in self._db['messages']:
-                self._db['messages'][chat_id] = []
-            
-            # Add message
-            self._db['messages'][chat_id].append(message)
-            
-            # Save changes
-            self._save_db()
+            self._conn().execute(
+                'INSERT INTO messages (chat_id, message_id, created_at, data) VALUES (?, ?, ?, ?)',
+                (chat_id, message.get('message_id'), message.get('created_at', ''), _to_json(message))
+            )
             return True
             
         except Exception as e:
@@ -177,31 +270,40 @@ class ChatRepository:
             chat_id (str): Chat ID to get messages for
             limit (int): Maximum number of messages to retrieve
             before_id (str): Get messages before this message ID (for pagination)
-            
+        
         Returns:
             list: List of message objects
         """
         try:
-            # Get all messages for chat
-            all_messages = self._db['messages'].get(chat_id, [])
+            conn = self._conn()
             
-            # Sort by created_at
-            all_messages.sort(key=lambda m: m.get('created_at', ''), reverse=True)
-            
-            # Filter by before_id if specified
+            # Filter by before_id if specified; an unknown ID returns the latest page
+            before = None
             if before_id:
-                # Find index of message with before_id
-                before_index = next((i for i, m in enumerate(all_messages) if m.get('message_id') == before_id), None)
-                
-                if before_index is not None:
-                    # Get messages after this index
-                    all_messages = all_messages[before_index + 1:]
+                before = conn.execute(
+                    'SELECT created_at, seq FROM messages WHERE chat_id = ? AND message_id = ?',
+                    (chat_id, before_id)
+                ).fetchone()
             
-            # Limit number of messages
-            limited_messages = all_messages[:limit]
+            # Newest first straight off the (chat_id, created_at, seq) index
+            if before:
+                rows = conn.execute(
+                    """
+                    SELECT data FROM messages
+                    WHERE chat_id = ? AND (created_at, seq) < (?, ?)
+                    ORDER BY created_at DESC, seq DESC
+                    LIMIT ?
+                    """,
+                    (chat_id, before[0], before[1], limit)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    'SELECT data FROM messages WHERE chat_id = ? ORDER BY created_at DESC, seq DESC LIMIT ?',
+                    (chat_id, limit)
+                ).fetchall()
             
             # Return in chronological order
-            return list(reversed(limited_messages))
+            return [orjson.loads(data) for (data,) in reversed(rows)]
             
         except Exception as e:
             logger.error(f"Error getting messages for chat {chat_id}: {str(e)}")
@@ -214,33 +316,35 @@ class ChatRepository:
         Args:
             chat_id (str): Chat ID to update
             message (dict): Last message object
-            
+        
         Returns:
             bool: Success or failure
         """
         try:
-            chat = self.get_chat(chat_id)
-            if not chat:
-                return False
-                
-            # Update last message info
-            chat['last_message'] = {
+            last_message = {
                 'content': message.get('content', ''),
                 'sender_id': message.get('sender_id', ''),
                 'created_at': message.get('created_at', datetime.utcnow().isoformat())
             }
             
-            # Update chat in DB
-            self._db['chats'][chat_id] = chat
-            
-            # Save changes
-            self._save_db()
-            return True
+            # Update last message info in place
+            cursor = self._conn().execute(
+                "UPDATE chats SET data = json_set(data, '$.last_message', json(?)) WHERE chat_id = ?",
+                (_to_json(last_message), chat_id)
+            )
+            return cursor.rowcount > 0
             
         except Exception as e:
             logger.error(f"Error updating last message for chat {chat_id}: {str(e)}")
             return False
     
+    def _set_read_status(self, chat_id, user_id, is_read):
+        """Store a user's read marker for a chat"""
+        self._conn().execute(
+            'INSERT OR REPLACE INTO read_status (chat_id, user_id, is_read) VALUES (?, ?, ?)',
+            (chat_id, user_id, int(is_read))
+        )
+    
     def mark_chat_read(self, chat_id, user_id):
         """
         Mark a chat as read for a user
@@ -248,16 +352,12 @@ class ChatRepository:
         Args:
             chat_id (str): Chat ID to mark
             user_id (str): User ID to mark chat as read for
-            
+        
         Returns:
             bool: Success or failure
         """
         try:
-            read_key = f"{chat_id}:{user_id}"
-            self._db['read_status'][read_key] = True
-            
-            # Save changes
-            self._save_db()
+            self._set_read_status(chat_id, user_id, True)
             return True
             
         except Exception as e:
@@ -271,16 +371,12 @@ class ChatRepository:
         Args:
             chat_id (str): Chat ID to mark
             user_id (str): User ID to mark chat as unread for
-            
+        
         Returns:
             bool: Success or failure
         """
         try:
-            read_key = f"{chat_id}:{user_id}"
-            self._db['read_status'][read_key] = False
-            
-            # Save changes
-            self._save_db()
+            self._set_read_status(chat_id, user_id, False)
             return True
             
         except Exception as e:
@@ -295,31 +391,38 @@ class ChatRepository:
             chat_id (str): Chat ID to update
             user_id (str): User ID to update status for
             status (str): New status
-            
+        
         Returns:
             bool: Success or failure
         """
+        conn = self._conn()
         try:
-            chat = self.get_chat(chat_id)
-            if not chat:
-                return False
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT data FROM chats WHERE chat_id = ?', (chat_id,)).fetchone()
+                if not row:
+                    conn.execute('ROLLBACK')
+                    return False
                 
-            # Update status if it exists already
-            if 'user_statuses' not in chat:
-                chat['user_statuses'] = {}
+                chat = orjson.loads(row[0])
                 
-            chat['user_statuses'][user_id] = {
-                'status': status,
-                'updated_at': datetime.utcnow().isoformat()
-            }
-            
-            # Update chat in DB
-            self._db['chats'][chat_id] = chat
+                # Update status if it exists already
+                if 'user_statuses' not in chat:
+                    chat['user_statuses'] = {}
+                
+                chat['user_statuses'][user_id] = {
+                    'status': status,
+                    'updated_at': datetime.utcnow().isoformat()
+                }
+                
+                conn.execute('UPDATE chats SET data = ? WHERE chat_id = ?', (_to_json(chat), chat_id))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
             
-            # Save changes
-            self._save_db()
             return True
             
         except Exception as e:
             logger.error(f"Error updating status for user {user_id} in chat {chat_id}: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
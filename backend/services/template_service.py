@@ -6,20 +6,49 @@ Handles template rendering with context data for server-side rendering
 import logging
 import os
 from datetime import datetime
-from flask import Flask, render_template, request, g
+from flask import Flask, render_template, request, g, stream_with_context
 
 logger = logging.getLogger(__name__)
 
+# Hot list-rendering templates that are rendered from a held compiled Template
+COMPILED_TEMPLATES = ('my_chats.html', 'chat.html')
+
 class TemplateService:
     """Service to handle template rendering with context data"""
     
     def __init__(self, app=None):
         """Initialize template service with Flask app"""
         self.app = app
+        self._compiled = {}
         
     def init_app(self, app):
         """Initialize with Flask app if not provided in constructor"""
         self.app = app
+        self._compiled = {}
+    
+    def precompile(self, template_names):
+        """
+        Load and compile templates ahead of the first request
+        
+        Args:
+            template_names (iterable): Names of the templates to compile
+            
+        Returns:
+            int: Number of templates compiled
+        """
+        compiled = 0
+        for template_name in template_names:
+            try:
+                template = self.app.jinja_env.get_template(template_name)
+            except Exception as e:
+                logger.warning(f"Could not precompile template {template_name}: {str(e)}")
+                continue
+            
+            if template_name in COMPILED_TEMPLATES:
+                self._compiled[template_name] = template
+            compiled += 1
+        
+        return compiled
     
     def render(self, template_name, **context):
         """
@@ -32,6 +61,52 @@ class TemplateService:
         Returns:
             str: Rendered HTML
         """
+        context = self._build_context(template_name, context)
+        
+        # Render hot templates straight from their compiled form
+        if template_name in COMPILED_TEMPLATES and not self.app.jinja_env.auto_reload:
+            return self._render_compiled(template_name, context)
+        
+        # Render the template
+        return render_template(template_name, **context)
+    
+    def stream(self, template_name, **context):
+        """
+        Render a template incrementally with the same context as render()
+        
+        The returned iterator yields HTML chunks as the template is evaluated
+        and keeps the request context alive, so it can be passed straight to
+        a Response.
+        
+        Args:
+            template_name (str): Name of the template to render
+            context (dict): Context variables for the template
+            
+        Returns:
+            iterator: Rendered HTML chunks
+        """
+        context = self._build_context(template_name, context)
+        
+        if template_name in COMPILED_TEMPLATES and not self.app.jinja_env.auto_reload:
+            template = self._get_compiled_template(template_name)
+        else:
+            template = self.app.jinja_env.get_template(template_name)
+        
+        # Apply Flask context processors (request, g, session, ...)
+        self.app.update_template_context(context)
+        return stream_with_context(template.generate(context))
+    
+    def _build_context(self, template_name, context):
+        """
+        Add common context, critical CSS and asset versions to a template context
+        
+        Args:
+            template_name (str): Name of the template being rendered
+            context (dict): Context variables for the template
+            
+        Returns:
+            dict: Complete template context
+        """
         # Add common context variables
         context.update(self._get_common_context())
         
@@ -43,8 +118,43 @@ class TemplateService:
         # Add asset versions for cache busting
         context['asset_versions'] = self._get_asset_versions()
         
-        # Render the template
-        return render_template(template_name, **context)
+        return context
+    
+    def _get_compiled_template(self, template_name):
+        """
+        Get the held compiled Template object, loading it on first use
+        
+        Args:
+            template_name (str): Name of the template
+            
+        Returns:
+            Template: Compiled Jinja template
+        """
+        template = self._compiled.get(template_name)
+        if template is None:
+            template = self.app.jinja_env.get_template(template_name)
+            self._compiled[template_name] = template
+        return template
+    
+    def _render_compiled(self, template_name, context):
+        """
+        Render a template from a held compiled Template object
+        
+        Skips the per-call loader lookup and auto-reload freshness check
+        that render_template performs for the template and its parents.
+        
+        Args:
+            template_name (str): Name of the template to render
+            context (dict): Context variables for the template
+            
+        Returns:
+            str: Rendered HTML
+        """
+        template = self._get_compiled_template(template_name)
+        
+        # Apply Flask context processors (request, g, session, ...)
+        self.app.update_template_context(context)
+        return template.render(context)
 
     def _get_common_context(self):
         """
@@ -72,7 +182,7 @@ class TemplateService:
         Returns:
             bool: True if authenticated, False otherwise
         """
-        return hasattr(g, 'user') and g.user is not None
+        return g.get('user') is not None
     
     def _get_user_context(self):
         """
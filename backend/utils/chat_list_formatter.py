@@ -15,13 +15,14 @@ class ChatListFormatter:
     """
     
     @staticmethod
-    def format_chat(chat, current_user_id):
+    def format_chat(chat, current_user_id, now=None):
         """
         Format a chat for display in the chat list
         
         Args:
             chat (dict): The chat to format
             current_user_id (str): ID of the current user
+            now (datetime): Reference time for relative times (defaults to utcnow)
             
         Returns:
             dict: Formatted chat
@@ -64,7 +65,8 @@ class ChatListFormatter:
                 
                 if created_at:
                     # Format for display
-                    now = datetime.utcnow()
+                    if now is None:
+                        now = datetime.utcnow()
                     diff = now - created_at
                     seconds = diff.total_seconds()
                     
@@ -132,7 +134,9 @@ class ChatListFormatter:
         Returns:
             list: Formatted chats
         """
-        formatted = [ChatListFormatter.format_chat(chat, current_user_id) for chat in chats]
+        # Share one reference time across the whole list
+        now = datetime.utcnow()
+        formatted = [ChatListFormatter.format_chat(chat, current_user_id, now) for chat in chats]
         
         # Sort by last message time, newest first
         formatted.sort(
@@ -156,9 +160,11 @@ class ChatListFormatter:
         """
         formatted_chats = ChatListFormatter.format_chats(chats, current_user_id)
         
-        # Group chats by unread status for rendering
-        unread_chats = [chat for chat in formatted_chats if chat.get('has_unread')]
-        read_chats = [chat for chat in formatted_chats if not chat.get('has_unread')]
+        # Group chats by unread status for rendering in a single pass
+        unread_chats = []
+        read_chats = []
+        for chat in formatted_chats:
+            (unread_chats if chat.get('has_unread') else read_chats).append(chat)
         
         return {
             'chats': formatted_chats,
@@ -0,0 +1,109 @@
+"""
+JWT Utility for ABDRE Chat Application
+Persistent HS256 encoder/decoder with the signing key prepared once
+"""
+
+import calendar
+import hmac
+import time
+from datetime import datetime
+
+import jwt
+import orjson
+from jwt.algorithms import HMACAlgorithm
+
+
+class _PreparedHMACAlgorithm(HMACAlgorithm):
+    """
+    HS256 algorithm that validates and converts its secret once
+    
+    Signing uses the one-shot hmac.digest, which runs HMAC-SHA256 in OpenSSL
+    without building a Python HMAC object per token.
+    """
+    
+    def __init__(self, secret):
+        super().__init__(HMACAlgorithm.SHA256)
+        self._prepared_key = super().prepare_key(secret)
+    
+    def prepare_key(self, key):
+        """Return the secret prepared at construction"""
+        return self._prepared_key
+    
+    def sign(self, msg, key):
+        """Compute the HMAC-SHA256 signature of msg"""
+        return hmac.digest(key, msg, 'sha256')
+    
+    def verify(self, msg, key, sig):
+        """Check sig against the HMAC-SHA256 signature of msg in constant time"""
+        return hmac.compare_digest(sig, hmac.digest(key, msg, 'sha256'))
+
+
+class JWTCodec:
+    """
+    HS256 token encoder/decoder bound to a single secret
+    
+    jwt.encode/jwt.decode look up the algorithm, re-validate the secret and
+    merge option dicts on every call. The codec keeps a PyJWS restricted to
+    HS256 whose algorithm object holds the prepared key, and validates the
+    only time claim this app issues (exp) itself.
+    """
+    
+    def __init__(self, secret):
+        """
+        Initialize the codec
+        
+        Args:
+            secret (str): HMAC secret
+        """
+        self._secret = secret
+        self._jws = jwt.PyJWS(algorithms=['HS256'])
+        self._jws.unregister_algorithm('HS256')
+        self._jws.register_algorithm('HS256', _PreparedHMACAlgorithm(secret))
+    
+    def encode(self, payload):
+        """
+        Encode a token
+        
+        Args:
+            payload (dict): Claims; datetime values are converted to UTC timestamps
+        
+        Returns:
+            str: Encoded token
+        """
+        claims = {
+            key: calendar.timegm(value.utctimetuple()) if isinstance(value, datetime) else value
+            for key, value in payload.items()
+        }
+        return self._jws.encode(orjson.dumps(claims), self._secret, algorithm='HS256')
+    
+    def decode(self, token):
+        """
+        Decode and verify a token
+        
+        Raises the same jwt exceptions as jwt.decode (InvalidSignatureError,
+        ExpiredSignatureError, DecodeError, ...).
+        
+        Args:
+            token (str): Encoded token
+        
+        Returns:
+            dict: Token payload
+        """
+        payload_json = self._jws.decode(token, self._secret, algorithms=['HS256'])
+        
+        try:
+            payload = orjson.loads(payload_json)
+        except orjson.JSONDecodeError as e:
+            raise jwt.DecodeError(f"Invalid payload string: {e}")
+        
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError("Invalid payload string: must be a json object")
+        
+        exp = payload.get('exp')
+        if exp is not None:
+            if not isinstance(exp, (int, float)):
+                raise jwt.DecodeError("Expiration Time claim (exp) must be an integer.")
+            if exp <= time.time():
+                raise jwt.ExpiredSignatureError("Signature has expired")
+        
+        return payload
@@ -9,6 +9,19 @@ import json
 from datetime import datetime
 from flask import url_for
 
+# URLs in (already escaped) message content, compiled once at import
+_URL_RE = re.compile(r'(https?:\/\/(?:www\.|(?!www))[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s]{2,}|www\.[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s]{2,}|https?:\/\/(?:www\.|(?!www))[a-zA-Z0-9]+\.[^\s]{2,}|www\.[a-zA-Z0-9]+\.[^\s]{2,})')
+_URL_LINK = r'<a href="\1" target="_blank" rel="noopener noreferrer">\1</a>'
+
+# Icon HTML by message status
+_STATUS_ICONS = {
+    'sending': '<i class="fas fa-clock"></i>',
+    'sent': '<i class="fas fa-check"></i>',
+    'delivered': '<i class="fas fa-check-double"></i>',
+    'read': '<i class="fas fa-check-double" style="color: #0d6efd;"></i>',
+    'failed': '<i class="fas fa-exclamation-triangle"></i>'
+}
+
 class MessageFormatter:
     """
     Formats chat messages for display
@@ -16,13 +29,14 @@ class MessageFormatter:
     """
     
     @staticmethod
-    def format_message(message, current_user_id):
+    def format_message(message, current_user_id, now=None):
         """
         Format a message for display
         
         Args:
             message (dict): The message to format
             current_user_id (str): ID of the current user
+            now (datetime): Reference time for relative times (defaults to utcnow)
             
         Returns:
             dict: Formatted message
@@ -50,7 +64,8 @@ class MessageFormatter:
             formatted['full_time_formatted'] = created_at.strftime('%Y-%m-%d %H:%M:%S')
             
             # Add relative time
-            now = datetime.utcnow()
+            if now is None:
+                now = datetime.utcnow()
             diff = now - created_at
             seconds = diff.total_seconds()
             
@@ -73,8 +88,7 @@ class MessageFormatter:
         content = html.escape(content)
         
         # Convert URLs to links
-        url_pattern = r'(https?:\/\/(?:www\.|(?!www))[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s]{2,}|www\.[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s]{2,}|https?:\/\/(?:www\.|(?!www))[a-zA-Z0-9]+\.[^\s]{2,}|www\.[a-zA-Z0-9]+\.[^\s]{2,})'
-        content = re.sub(url_pattern, r'<a href="\1" target="_blank" rel="noopener noreferrer">\1</a>', content)
+        content = _URL_RE.sub(_URL_LINK, content)
         
         # Convert line breaks to <br>
         content = content.replace('\n', '<br>')
@@ -105,7 +119,9 @@ class MessageFormatter:
         Returns:
             list: Formatted messages
         """
-        return [MessageFormatter.format_message(message, current_user_id) 
+        # Share one reference time across the whole list
+        now = datetime.utcnow()
+        return [MessageFormatter.format_message(message, current_user_id, now) 
                 for message in messages]
     
     @staticmethod
@@ -119,18 +135,7 @@ class MessageFormatter:
         Returns:
             str: Icon HTML
         """
-        if status == 'sending':
-            return '<i class="fas fa-clock"></i>'
-        elif status == 'sent':
-            return '<i class="fas fa-check"></i>'
-        elif status == 'delivered':
-            return '<i class="fas fa-check-double"></i>'
-        elif status == 'read':
-            return '<i class="fas fa-check-double" style="color: #0d6efd;"></i>'
-        elif status == 'failed':
-            return '<i class="fas fa-exclamation-triangle"></i>'
-        else:
-            return ''
+        return _STATUS_ICONS.get(status, '')
     
     @staticmethod
     def group_messages_by_date(messages):